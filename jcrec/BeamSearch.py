@@ -0,0 +1,197 @@
+import os
+import json
+
+import numpy as np
+
+import parallel
+import profiler
+
+
+class BeamSearch:
+    # The BeamSearch class keeps the beam_width best sequences of courses at each step instead of only the best one as Greedy.
+    # The sequences are scored as in Greedy and Optimal, by the number of applicable jobs and then the attractiveness.
+    # With a beam width of 1 it makes the same recommendations as Greedy, and with a large beam width it explores all the sequences.
+    def __init__(self, dataset, threshold):
+        self.dataset = dataset
+        self.threshold = threshold
+        self.beam_width = dataset.config.get("beam_width", 3)
+        if self.beam_width < 1:
+            raise ValueError(f"beam_width must be at least 1, got {self.beam_width}")
+
+    def update_learner_profile(self, learner, course):
+        """Update the learner profile with the skills and levels provided by the course
+
+        Args:
+            learner (list): list of skills and mastery level of the learner
+            course (list): list of required (resp. provided) skills and mastery level of the course
+        """
+        learner = np.maximum(learner, course[1])
+        return learner
+
+    def get_candidates(self, beam):
+        """Extend each sequence of the beam with each of its enrollable courses, all the sequences are scored at once
+
+        Args:
+            beam (list): the sequences of the beam as tuples (skills of the learner, sequence of courses)
+
+        Returns:
+            list: the extended sequences as tuples (nb of applicable jobs, attractiveness, skills of the learner, sequence of courses),
+                in the order of the beam and then of the courses
+        """
+        enrollable, _ = self.dataset.get_batch_enrollable_courses(
+            [learner for learner, _ in beam], self.threshold
+        )
+        beam_ids, courses_ids = np.nonzero(enrollable)
+        if len(courses_ids) == 0:
+            return []
+        learners = np.stack([learner for learner, _ in beam])
+        tmp_learners = np.maximum(
+            learners[beam_ids], np.asarray(self.dataset.courses[courses_ids])[:, 1]
+        )
+        all_nb_applicable_jobs = self.dataset.get_batch_nb_applicable_jobs(
+            tmp_learners, self.threshold
+        )
+        all_attractiveness = self.dataset.get_batch_learner_attractiveness(tmp_learners)
+        return [
+            (int(nb_applicable_jobs), int(attractiveness), tmp_learner, beam[beam_id][1] + [id_c])
+            for beam_id, id_c, tmp_learner, nb_applicable_jobs, attractiveness in zip(
+                beam_ids.tolist(),
+                courses_ids.tolist(),
+                tmp_learners,
+                all_nb_applicable_jobs,
+                all_attractiveness,
+            )
+        ]
+
+    @profiler.profiled
+    def search_course_recommendation(self, learner, k):
+        """Search a sequence of k courses for the learner with a beam search
+
+        Args:
+            learner (list): list of skills and mastery level of the learner
+            k (int): number of courses to recommend
+
+        Returns:
+            list: the ids of the courses recommended
+        """
+        beam = [(np.asarray(learner), [])]
+        best_sequence = []
+        for _ in range(k):
+            candidates = self.get_candidates(beam)
+            # the sequences that lead to the same skills as a better (or earlier) sequence are not kept, e.g. the permutations
+            # of the same courses; as in Greedy, a course that gives neither applicable jobs nor attractiveness is not taken
+            candidates.sort(key=lambda candidate: (-candidate[0], -candidate[1]))
+            beam = []
+            skill_profiles = set()
+            for nb_applicable_jobs, attractiveness, tmp_learner, sequence in candidates:
+                if nb_applicable_jobs == 0 and attractiveness == 0:
+                    break
+                key = tmp_learner.tobytes()
+                if key in skill_profiles:
+                    continue
+                skill_profiles.add(key)
+                beam.append((tmp_learner, sequence))
+                profiler.count("BeamSearch.sequences")
+                if len(beam) == self.beam_width:
+                    break
+            if not beam:
+                break
+            # the courses only add skills, so the best sequence is the best one of the last step
+            best_sequence = beam[0][1]
+        return best_sequence
+
+    def recommend_and_update(self, learner_id, k):
+        """Recommend a sequence of courses to the learner and update the learner profile
+
+        Args:
+            learner_id (int): index of the learner
+            k (int): number of courses to recommend
+
+        Returns:
+            list: the ids of the courses recommended
+        """
+        learner = self.dataset.learners[learner_id]
+        course_recommendations_list = self.search_course_recommendation(learner, k)
+        for id_c in course_recommendations_list:
+            learner = self.update_learner_profile(learner, self.dataset.courses[id_c])
+        self.dataset.learners[learner_id] = learner
+        return course_recommendations_list
+
+    def beam_search_recommendation(self, k, run):
+        """Recommend a sequence of k courses to each learner with the beam search and save the results in a json file
+
+        Args:
+            k (int): number of courses to recommend to each learner
+            run (int): run number
+        """
+        results = dict()
+
+        avg_l_attrac = self.dataset.get_avg_learner_attractiveness()
+        print(f"The average attractiveness of the learners is {avg_l_attrac:.2f}")
+
+        results["original_attractiveness"] = avg_l_attrac
+
+        avg_app_j = self.dataset.get_avg_applicable_jobs(self.threshold)
+        print(f"The average nb of applicable jobs per learner is {avg_app_j:.2f}")
+
+        results["original_applicable_jobs"] = avg_app_j
+
+        time_start = parallel.cpu_time()
+        recommendations = dict()
+
+        # the learners are processed in parallel if nb_workers > 1 in the config
+        recommendation_sequences = parallel.recommend_learners(
+            self,
+            "recommend_and_update",
+            k,
+            self.dataset.config.get("nb_workers", 1),
+            self.dataset.config.get("chunk_size", 16),
+        )
+        for i, recommendation_sequence in enumerate(recommendation_sequences):
+            index = self.dataset.learners_index[i]
+            recommendations[index] = self.dataset.courses_index.get_ids(
+                recommendation_sequence
+            )
+
+        time_end = parallel.cpu_time()
+        avg_recommendation_time = (time_end - time_start) / len(self.dataset.learners)
+
+        print(f"Average Recommendation Time: {avg_recommendation_time:.4f} seconds")
+
+        results["avg_recommendation_time"] = avg_recommendation_time
+
+        avg_l_attrac = self.dataset.get_avg_learner_attractiveness()
+        print(f"The new average attractiveness of the learners is {avg_l_attrac:.2f}")
+
+        results["new_attractiveness"] = avg_l_attrac
+
+        avg_app_j = self.dataset.get_avg_applicable_jobs(self.threshold)
+        print(f"The new average nb of applicable jobs per learner is {avg_app_j:.2f}")
+
+        results["new_applicable_jobs"] = avg_app_j
+
+        results["recommendations"] = recommendations
+
+        filename = (
+            "beam_search_width_"
+            + str(self.beam_width)
+            + "_nbskills_"
+            + str(len(self.dataset.skills))
+            + "_k_"
+            + str(k)
+            + "_run_"
+            + str(run)
+            + ".json"
+        )
+
+        json.dump(
+            results,
+            open(
+                os.path.join(
+                    self.dataset.config["results_path"],
+                    filename,
+                ),
+                "w",
+            ),
+            indent=4,
+        )
@@ -1,33 +1,42 @@
 import os
 import random
+import inspect
 
 from time import process_time
 import numpy as np
 import gymnasium as gym
 from gymnasium import spaces
 from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env import VecEnv
 
 import matchings
+import profiler
+from JobMatchState import JobMatchState
+from SkillMatrix import LEVEL_DTYPE
 
 
 class CourseRecEnv(gym.Env):
     # The CourseRecEnv class is a gym environment that simulates the recommendation of courses to learners. It is used to train the Reinforce model.
-    def __init__(self, dataset, threshold=0.8, k=3):
+    def __init__(self, dataset, threshold=0.8, k=3, reward_cache=None):
         self.dataset = dataset
+        # the number of applicable jobs of the visited skill profiles are memoized in the RewardCache if it is given,
+        # otherwise they are kept up to date by a JobMatchState
+        self.reward_cache = reward_cache
         self.nb_skills = len(dataset.skills)
         self.mastery_levels = [
             elem for elem in list(dataset.mastery_levels.values()) if elem > 0
         ]
         self.max_level = max(self.mastery_levels)
         self.nb_courses = len(dataset.courses)
-        # get the minimum and maximum number of skills of the learners using np.nonzero
-        self.min_skills = min(np.count_nonzero(self.dataset.learners, axis=1))
-        self.max_skills = max(np.count_nonzero(self.dataset.learners, axis=1))
+        # get the minimum and maximum number of skills of the learners using np.count_nonzero row by row (the learners can be a SkillMatrix)
+        nb_learner_skills = [np.count_nonzero(learner) for learner in self.dataset.learners]
+        self.min_skills = min(nb_learner_skills)
+        self.max_skills = max(nb_learner_skills)
         self.threshold = threshold
         self.k = k
         # The observation space is a vector of length nb_skills that represents the learner's skills
         self.observation_space = gym.spaces.Box(
-            low=0, high=self.max_level, shape=(self.nb_skills,), dtype=np.int32
+            low=0, high=self.max_level, shape=(self.nb_skills,), dtype=LEVEL_DTYPE
         )
         # The action space is a discrete space of size nb_courses that represents the courses to be recommended
         self.action_space = gym.spaces.Discrete(self.nb_courses)
@@ -40,18 +49,16 @@ class CourseRecEnv(gym.Env):
         """
         return self._agent_skills
 
+    @profiler.profiled
     def _get_info(self):
         """Method required by the gym environment. It returns the current info of the environment.
 
         Returns:
             dict: the current info of the environment, that is the number of applicable jobs
         """
-
-        return {
-            "nb_applicable_jobs": self.dataset.get_nb_applicable_jobs(
-                self._agent_skills, threshold=self.threshold
-            )
-        }
+        if self.reward_cache is not None:
+            return {"nb_applicable_jobs": self.nb_applicable_jobs}
+        return {"nb_applicable_jobs": self.job_match_state.nb_applicable_jobs}
 
     def get_random_learner(self):
         """Creates a random learner with a random number of skills and levels. This method is used to initialize the environment.
@@ -63,7 +70,7 @@ class CourseRecEnv(gym.Env):
         n_skills = random.randint(self.min_skills, self.max_skills)
 
         # Initialize the skills array with zeros
-        initial_skills = np.zeros(self.nb_skills, dtype=np.int32)
+        initial_skills = np.zeros(self.nb_skills, dtype=LEVEL_DTYPE)
 
         # Choose unique skill indices without replacement
         skill_indices = np.random.choice(self.nb_skills, size=n_skills, replace=False)
@@ -74,6 +81,7 @@ class CourseRecEnv(gym.Env):
         )
         return initial_skills
 
+    @profiler.profiled
     def reset(self, seed=None, learner=None):
         """Method required by the gym environment. It resets the environment to its initial state.
 
@@ -88,14 +96,24 @@ class CourseRecEnv(gym.Env):
         super().reset(seed=seed)
 
         if learner is not None:
-            self._agent_skills = learner
+            self._agent_skills = np.asarray(learner, dtype=LEVEL_DTYPE)
         else:
             self._agent_skills = self.get_random_learner()
+        if self.reward_cache is not None:
+            self.nb_applicable_jobs = self.reward_cache.get_nb_applicable_jobs(
+                self._agent_skills
+            )
+        else:
+            # The matching of the learner with the jobs is updated incrementally at each step
+            self.job_match_state = JobMatchState(
+                self.dataset, self._agent_skills, self.threshold
+            )
         self.nb_recommendations = 0
         observation = self._get_obs()
         info = self._get_info()
         return observation, info
 
+    @profiler.profiled
     def step(self, action):
         """Method required by the gym environment. It performs the action in the environment and returns the new observation, the reward, whether the episode is terminated and additional information.
 
@@ -120,6 +138,12 @@ class CourseRecEnv(gym.Env):
             return observation, reward, terminated, False, info
 
         self._agent_skills = np.maximum(self._agent_skills, course[1])
+        if self.reward_cache is not None:
+            self.nb_applicable_jobs = self.reward_cache.get_nb_applicable_jobs(
+                self._agent_skills
+            )
+        else:
+            self.job_match_state.update(course)
 
         observation = self._get_obs()
         info = self._get_info()
@@ -129,6 +153,259 @@ class CourseRecEnv(gym.Env):
 
         return observation, reward, terminated, False, info
 
+    def action_masks(self):
+        """Method used by the maskable models of sb3-contrib. It returns the courses that the current learner can take.
+
+        Returns:
+            np.array: true for each course that does not end the episode
+        """
+        return get_action_masks(self.dataset, [self._agent_skills], self.threshold)[0]
+
+
+def get_action_masks(dataset, learners, threshold):
+    """Get the courses that each learner can take with the same rules as CourseRecEnv.step, so that a maskable model only
+    samples the actions that do not end the episode. The learners that can not take any course have all the actions
+    allowed, and their episode ends with the first one as without masking.
+
+    Args:
+        dataset (Dataset): the dataset
+        learners (np.array): matrix of the skills of the learners
+        threshold (float): the threshold for the matching
+
+    Returns:
+        np.array: boolean matrix of shape (nb_learners, nb_courses) that is true if the learner can take the course
+    """
+    required_matching, provided_matching = matchings.batch_course_matchings(
+        np.asarray(learners),
+        dataset.required_matching_index,
+        dataset.provided_matching_index,
+    )
+    # the courses that do not provide any skill have a provided matching of 0, so they are accepted as in get_invalid_actions
+    masks = (required_matching >= threshold) & (provided_matching < 1.0)
+    masks[~masks.any(axis=1)] = True
+    return masks
+
+
+def get_invalid_actions(dataset, learners, actions, threshold):
+    """Get the actions that end the episode of each learner without changing their skills, with the same rules as CourseRecEnv.step
+
+    Args:
+        dataset (Dataset): the dataset
+        learners (np.array): matrix of the skills of the learners
+        actions (np.array): the course recommended to each learner
+        threshold (float): the threshold for the matching
+
+    Returns:
+        np.array: true if the learner can not take the course recommended to them
+    """
+    required_index = matchings.select_matching_index(
+        dataset.required_matching_index, actions
+    )
+    provided_index = matchings.select_matching_index(
+        dataset.provided_matching_index, actions
+    )
+
+    # required and provided matchings of each learner with the course recommended to them
+    required_matching = matchings.pairwise_matching(learners, required_index)
+    required_matching[required_index["counts"] == 0] = 1.0
+    provided_matching = matchings.pairwise_matching(learners, provided_index)
+    # a course that does not provide any skill is accepted, as with the nan provided matching of CourseRecEnv
+    return (required_matching < threshold) | (
+        (provided_matching >= 1.0) & (provided_index["counts"] > 0)
+    )
+
+
+def batch_recommendation(
+    model, dataset, learners, threshold, k, batch_size=1024, reward_cache=None
+):
+    """Run the episodes of a trained model for a matrix of learners at once. The observations of all the learners whose
+    episode is not terminated are stacked for a single call to model.predict at each step, so the recommendations are the
+    same as when the learners are evaluated one by one with CourseRecEnv.
+
+    Args:
+        model (BaseAlgorithm): the trained stable-baselines3 model
+        dataset (Dataset): the dataset
+        learners (np.array): matrix of the skills of the learners
+        threshold (float): the threshold for the matching
+        k (int): the maximum number of courses recommended to each learner
+        batch_size (int, optional): number of learners evaluated at once. Defaults to 1024.
+        reward_cache (RewardCache, optional): cache of the number of applicable jobs of the learners. Defaults to None.
+
+    Returns:
+        tuple: the list of the courses recommended to each learner, the skills of the learners after the courses and their
+            number of applicable jobs
+    """
+    # the maskable models only choose among the courses that the learners can take
+    use_masks = "action_masks" in inspect.signature(model.predict).parameters
+    recommendations = []
+    new_learners = []
+    for start in range(0, len(learners), batch_size):
+        skills = np.array(learners[start : start + batch_size])
+        sequences = [[] for _ in range(len(skills))]
+        # learners whose episode is not terminated
+        active = np.arange(len(skills))
+        # an episode ends with an invalid course or after k valid courses
+        for _ in range(k):
+            if len(active) == 0:
+                break
+            if use_masks:
+                actions, _state = model.predict(
+                    skills[active],
+                    deterministic=True,
+                    action_masks=get_action_masks(dataset, skills[active], threshold),
+                )
+            else:
+                actions, _state = model.predict(skills[active], deterministic=True)
+            actions = np.asarray(actions).reshape(len(active))
+            valid = ~get_invalid_actions(dataset, skills[active], actions, threshold)
+            active, actions = active[valid], actions[valid]
+            provided = np.asarray(dataset.courses[actions])[:, 1]
+            skills[active] = np.maximum(skills[active], provided)
+            for i, action in zip(active, actions.tolist()):
+                sequences[i].append(action)
+        recommendations.extend(sequences)
+        new_learners.append(skills)
+
+    new_learners = np.concatenate(new_learners) if new_learners else np.asarray(learners)
+    if reward_cache is not None:
+        nb_applicable_jobs, _ = reward_cache.get(new_learners)
+    else:
+        nb_applicable_jobs = dataset.get_batch_nb_applicable_jobs(new_learners, threshold)
+    return recommendations, new_learners, nb_applicable_jobs
+
+
+class CourseRecVecEnv(VecEnv):
+    # The CourseRecVecEnv class simulates nb_envs CourseRecEnv environments at once. The courses are applied and the rewards are
+    # computed with array operations on the matrix of the learners' skills instead of one environment at a time.
+    def __init__(self, dataset, threshold=0.8, k=3, nb_envs=8, reward_cache=None):
+        # The single environment is used for its spaces and to create the random learners
+        self.env = CourseRecEnv(dataset, threshold=threshold, k=k)
+        self.dataset = dataset
+        self.reward_cache = reward_cache
+        self.threshold = threshold
+        self.k = k
+        super().__init__(nb_envs, self.env.observation_space, self.env.action_space)
+        self._agent_skills = np.zeros((nb_envs, self.env.nb_skills), dtype=LEVEL_DTYPE)
+        self.nb_recommendations = np.zeros(nb_envs, dtype=int)
+        self.nb_applicable_jobs = np.zeros(nb_envs, dtype=int)
+        self.actions = None
+
+    @profiler.profiled
+    def reset_envs(self, envs):
+        """Reset some environments with random learners
+
+        Args:
+            envs (np.array): indices of the environments to reset
+        """
+        for i in envs:
+            self._agent_skills[i] = self.env.get_random_learner()
+        self.nb_recommendations[envs] = 0
+        self.nb_applicable_jobs[envs] = self.get_nb_applicable_jobs(envs)
+
+    def get_nb_applicable_jobs(self, envs):
+        """Get the number of applicable jobs of the learners of some environments, from the RewardCache if it is given
+
+        Args:
+            envs (np.array): indices of the environments
+
+        Returns:
+            np.array: the number of applicable jobs of the learner of each environment
+        """
+        if self.reward_cache is not None:
+            return self.reward_cache.get(self._agent_skills[envs])[0]
+        return self.dataset.get_batch_nb_applicable_jobs(
+            self._agent_skills[envs], self.threshold
+        )
+
+    def reset(self):
+        """Method required by the vectorized environment. It resets all the environments with random learners.
+
+        Returns:
+            np.array: the observations of the environments, that is the matrix of the learners' skills
+        """
+        self.reset_envs(np.arange(self.num_envs))
+        self.reset_infos = [
+            {"nb_applicable_jobs": nb_applicable_jobs}
+            for nb_applicable_jobs in self.nb_applicable_jobs.tolist()
+        ]
+        return self._agent_skills.copy()
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions).reshape(self.num_envs)
+
+    @profiler.profiled
+    def step_wait(self):
+        """Method required by the vectorized environment. It performs the actions of all the environments at once, with the
+        same rules as CourseRecEnv.step, and resets the environments whose episode is terminated.
+
+        Returns:
+            tuple: the new observations, the rewards, whether the episodes are terminated and additional information
+        """
+        actions = self.actions
+        invalid = get_invalid_actions(
+            self.dataset, self._agent_skills, actions, self.threshold
+        )
+        valid = np.flatnonzero(~invalid)
+
+        # Update the skills of the learners with a valid course and their number of applicable jobs
+        provided = np.asarray(self.dataset.courses[actions[valid]])[:, 1]
+        self._agent_skills[valid] = np.maximum(self._agent_skills[valid], provided)
+        self.nb_applicable_jobs[valid] = self.get_nb_applicable_jobs(valid)
+        self.nb_recommendations[valid] += 1
+
+        rewards = np.where(invalid, -1, self.nb_applicable_jobs).astype(np.float32)
+        dones = invalid | (self.nb_recommendations == self.k)
+        infos = [
+            {"nb_applicable_jobs": nb_applicable_jobs}
+            for nb_applicable_jobs in self.nb_applicable_jobs.tolist()
+        ]
+
+        # Reset the terminated environments, the last observation of their episode is kept in the infos
+        terminated = np.flatnonzero(dones)
+        for i in terminated:
+            infos[i]["terminal_observation"] = self._agent_skills[i].copy()
+            infos[i]["TimeLimit.truncated"] = False
+        if len(terminated) > 0:
+            self.reset_envs(terminated)
+
+        return self._agent_skills.copy(), rewards, dones, infos
+
+    def action_masks(self):
+        """Method used by the maskable models of sb3-contrib. It returns the courses that the learner of each environment can take.
+
+        Returns:
+            np.array: boolean matrix of shape (nb_envs, nb_courses)
+        """
+        return get_action_masks(self.dataset, self._agent_skills, self.threshold)
+
+    def close(self):
+        pass
+
+    def get_indices(self, indices):
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self.env, attr_name) for _ in self.get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self.env, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        if method_name == "action_masks":
+            # the masks depend on the learner of each environment, they are computed at once
+            return list(self.action_masks()[list(self.get_indices(indices))])
+        return [
+            getattr(self.env, method_name)(*method_args, **method_kwargs)
+            for _ in self.get_indices(indices)
+        ]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self.get_indices(indices)]
+
 
 class EvaluateCallback(BaseCallback):
     # The EvaluateCallback class is a callback that evaluates the model at regular intervals during the training.
@@ -141,27 +418,27 @@ class EvaluateCallback(BaseCallback):
 
     def _on_step(self):
         """Method required by the callback. It is called at each step of the training. It evaluates the model every eval_freq steps.
+        The iterations are counted in steps of the environments (num_timesteps), nb_envs per step of a vectorized environment.
 
         Returns:
             bool: Always returns True to continue training
         """
         if self.n_calls % self.eval_freq == 0:
             time_start = process_time()
-            avg_jobs = 0
-            for learner in self.eval_env.dataset.learners:
-                self.eval_env.reset(learner=learner)
-                done = False
-                tmp_avg_jobs = self.eval_env._get_info()["nb_applicable_jobs"]
-                while not done:
-                    obs = self.eval_env._get_obs()
-                    action, _state = self.model.predict(obs, deterministic=True)
-                    obs, reward, done, _, info = self.eval_env.step(action)
-                    if reward != -1:
-                        tmp_avg_jobs = reward
-                avg_jobs += tmp_avg_jobs
+            # all the learners are evaluated at once with batched predictions
+            with profiler.timer("EvaluateCallback.evaluate"):
+                _, _, nb_applicable_jobs = batch_recommendation(
+                    self.model,
+                    self.eval_env.dataset,
+                    self.eval_env.dataset.learners,
+                    self.eval_env.threshold,
+                    self.eval_env.k,
+                    reward_cache=self.eval_env.reward_cache,
+                )
+            avg_jobs = int(nb_applicable_jobs.sum())
             time_end = process_time()
             print(
-                f"Iteration {self.n_calls}. Average jobs: {avg_jobs / len(self.eval_env.dataset.learners)} Time: {time_end - time_start}"
+                f"Iteration {self.num_timesteps}. Average jobs: {avg_jobs / len(self.eval_env.dataset.learners)} Time: {time_end - time_start}"
             )
             with open(
                 os.path.join(
@@ -171,7 +448,7 @@ class EvaluateCallback(BaseCallback):
                 self.mode,
             ) as f:
                 f.write(
-                    str(self.n_calls)
+                    str(self.num_timesteps)
                     + " "
                     + str(avg_jobs / len(self.eval_env.dataset.learners))
                     + " "
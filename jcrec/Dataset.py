@@ -1,20 +1,105 @@
+import os
 import json
 import random
+import shutil
+import hashlib
+import itertools
 
-import pandas as pd
 import numpy as np
 
-from collections import defaultdict
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 import matchings
+import profiler
+from IdIndex import IdIndex
+from SkillMatrix import SkillMatrix, LEVEL_DTYPE
 
 
 class Dataset:
     # The Dataset class is used to load and store the data of the recommendation problem
+    # files and config parameters that the compiled dataset of the cache depends on
+    cache_files = [
+        "taxonomy_path",
+        "course_path",
+        "cv_path",
+        "job_path",
+        "mastery_levels_path",
+    ]
+    cache_parameters = [
+        "level_3",
+        "max_cv_skills",
+        "seed",
+        "nb_cvs",
+        "nb_jobs",
+        "nb_courses",
+        "sparse",
+    ]
+    # version of the files of the cache, part of the hash so that the caches of an older version are not loaded
+    cache_version = 2
+    # matching indexes of the jobs and courses, saved in the cache with the matrices
+    cached_indexes = [
+        "jobs_matching_index",
+        "jobs_inverted_index",
+        "required_matching_index",
+        "provided_matching_index",
+    ]
+
+    @profiler.profiled
     def __init__(self, config):
         self.config = config
-        self.load_data()
+        if self.config.get("mmap", False) and self.config.get("cache_path") is None:
+            raise ValueError("mmap requires cache_path, the memory maps are opened on the files of the cache")
+        # the data and its indexes are loaded from the cache if it was already compiled with the same files and config
+        if not self.load_cache():
+            self.load_data()
+            self.get_indexes()
+            self.save_cache()
+            # with mmap, the jobs, courses and indexes are opened again from the files that were just saved
+            if self.config.get("mmap", False):
+                self.load_cache()
+
+    @classmethod
+    def from_matrices(cls, config, learners, jobs, courses, mastery_levels):
+        """Create a dataset directly from the matrices of mastery levels instead of the files of the config, e.g. for
+        synthetic data. The skills are the columns of the matrices and the ids of the rows are their indices as strings
+
+        Args:
+            config (dict): the config, the paths of the files are not used
+            learners (np.array): matrix of shape (nb_learners, nb_skills)
+            jobs (np.array): matrix of shape (nb_jobs, nb_skills)
+            courses (np.array): matrix of shape (nb_courses, 2, nb_skills) with the required and provided skills
+            mastery_levels (dict): mastery levels as in the mastery levels file
+
+        Returns:
+            Dataset: the dataset
+        """
+        dataset = cls.__new__(cls)
+        dataset.config = config
+        dataset.rng = random.Random(config["seed"])
+        nb_skills = courses.shape[-1]
+        dataset.skills = set(range(nb_skills))
+        dataset.skills2int = {skill: skill for skill in range(nb_skills)}
+        dataset.mastery_levels = mastery_levels
+        dataset.max_learner_skills = config["max_cv_skills"]
+        for name, matrix in [("learners", learners), ("jobs", jobs), ("courses", courses)]:
+            if config.get("sparse", False) and not isinstance(matrix, SkillMatrix):
+                matrix = SkillMatrix.from_dense(matrix)
+            elif not isinstance(matrix, SkillMatrix):
+                matrix = np.array(matrix, dtype=LEVEL_DTYPE)
+            setattr(dataset, name, matrix)
+            setattr(dataset, f"{name}_index", IdIndex(np.arange(len(matrix))))
+        dataset.make_course_consistent()
+        dataset.get_indexes()
+        return dataset
+
+    @profiler.profiled
+    def get_indexes(self):
+        """Build the indexes of the jobs and courses used to compute the matchings"""
         self.get_jobs_inverted_index()
+        self.get_courses_index()
 
     def __str__(self):
         # override the __str__ method to print the dataset
@@ -25,6 +110,59 @@ class Dataset:
             f"{len(self.skills)} skills."
         )
 
+    def iter_chunks(self, records):
+        """Split an iterable of records in lists of load_chunk_size records (from the config), so that only one chunk of
+        records is held in memory at a time while the files are read
+
+        Args:
+            records (iterable): the records
+
+        Yields:
+            list: the records of a chunk
+        """
+        records = iter(records)
+        chunk_size = self.config.get("load_chunk_size", 10000)
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                break
+            yield chunk
+
+    def get_skill_matrix(self, chunks, row_shape):
+        """Create the matrix of mastery levels from an iterable of chunks of rows. If sparse is true in the config, the matrix
+        is a SkillMatrix in CSR format, otherwise it is a dense numpy array, both with LEVEL_DTYPE levels
+
+        Args:
+            chunks (iterable): tuples (nb_rows, keys, levels) with the sorted flat keys row * row_size + position of the non
+                zero elements of a chunk of rows and their mastery levels, as returned by get_avg_levels
+            row_shape (tuple): shape of a row of the matrix
+
+        Returns:
+            np.array or SkillMatrix: the matrix of mastery levels
+        """
+        row_size = int(np.prod(row_shape))
+        if self.config.get("sparse", False):
+            matrices = []
+            for nb_rows, keys, levels in chunks:
+                # the keys are sorted, so the elements are already in the order of the CSR arrays
+                indptr = np.zeros(nb_rows + 1, dtype=np.int64)
+                indptr[1:] = np.cumsum(np.bincount(keys // row_size, minlength=nb_rows))
+                matrices.append(
+                    SkillMatrix(indptr, keys % row_size, levels, (nb_rows,) + row_shape)
+                )
+            return SkillMatrix.concatenate(matrices, row_shape)
+
+        # the non zero elements of the chunks are kept until the number of rows is known, then the dense matrix is
+        # allocated once and filled chunk by chunk, so it is never held twice in memory
+        chunks = list(chunks)
+        matrix = np.zeros(sum(nb_rows for nb_rows, _, _ in chunks) * row_size, dtype=LEVEL_DTYPE)
+        offset = 0
+        for nb_rows, keys, levels in chunks:
+            matrix[offset + keys] = levels
+            offset += nb_rows * row_size
+        return matrix.reshape((-1,) + row_shape)
+
+    @profiler.profiled
     def load_data(self):
         """Load the data from the files specified in the config and store it in the class attributes"""
         self.rng = random.Random(self.config["seed"])
@@ -36,7 +174,178 @@ class Dataset:
         self.get_subsample()
         self.make_course_consistent()
 
+    def get_cache_directory(self):
+        """Get the directory of the compiled dataset in the cache. Its name is a hash of the content of the input files and
+        of the config parameters used to build the dataset
+
+        Returns:
+            str: path of the directory, None if cache_path is not set in the config
+        """
+        if self.config.get("cache_path") is None:
+            return None
+
+        cache_key = hashlib.sha256()
+        for path_key in self.cache_files:
+            with open(self.config[path_key], "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    cache_key.update(block)
+        for key in self.cache_parameters:
+            cache_key.update(f"{key}={self.config.get(key)};".encode())
+        cache_key.update(f"dtype={np.dtype(LEVEL_DTYPE).name};".encode())
+        cache_key.update(f"version={self.cache_version};".encode())
+        return os.path.join(self.config["cache_path"], cache_key.hexdigest())
+
+    @profiler.profiled
+    def save_cache(self):
+        """Save the loaded data and its indexes in the cache directory as numpy files and a json file for the dictionaries"""
+        directory = self.get_cache_directory()
+        if directory is None or os.path.isdir(directory):
+            return
+
+        # write in a temporary directory first so that a partially written cache is never loaded
+        tmp_directory = f"{directory}.tmp{os.getpid()}"
+        os.makedirs(tmp_directory, exist_ok=True)
+        metadata = {
+            "skills": sorted(int(skill) for skill in self.skills),
+            "skills2int": [[int(k), int(v)] for k, v in self.skills2int.items()],
+            "mastery_levels": self.mastery_levels,
+            "max_learner_skills": self.max_learner_skills,
+            "shapes": dict(),
+            "indexes": dict(),
+        }
+        for name in ["learners", "jobs", "courses"]:
+            matrix = getattr(self, name)
+            metadata["shapes"][name] = list(matrix.shape)
+            if isinstance(matrix, SkillMatrix):
+                for array_name in ["indptr", "indices", "data"]:
+                    np.save(
+                        os.path.join(tmp_directory, f"{name}_{array_name}.npy"),
+                        getattr(matrix, array_name),
+                    )
+            else:
+                np.save(os.path.join(tmp_directory, f"{name}.npy"), matrix)
+
+            # the ids of the rows, in the order of the rows
+            np.save(
+                os.path.join(tmp_directory, f"{name}_ids.npy"),
+                getattr(self, f"{name}_index").ids,
+            )
+
+        # the arrays of the matching indexes are saved as numpy files and their integers in the metadata (the summation
+        # plans of the matchings are not saved, they are computed on the first matching)
+        for name in self.cached_indexes:
+            index = getattr(self, name)
+            metadata["indexes"][name] = {
+                "arrays": [key for key, value in index.items() if isinstance(value, np.ndarray)],
+                "integers": {
+                    key: int(value)
+                    for key, value in index.items()
+                    if isinstance(value, (int, np.integer))
+                },
+            }
+            for key in metadata["indexes"][name]["arrays"]:
+                np.save(os.path.join(tmp_directory, f"{name}_{key}.npy"), index[key])
+
+        # the inverted index of the courses is saved in CSR format, the courses of the skill skills[i] are
+        # courses[indptr[i] : indptr[i + 1]]
+        skills = list(self.courses_inverted_index)
+        courses = [self.courses_inverted_index[skill] for skill in skills]
+        indptr = np.zeros(len(skills) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(skill_courses) for skill_courses in courses])
+        for array_name, array in [
+            ("skills", np.array(skills, dtype=np.int64)),
+            ("indptr", indptr),
+            ("courses", np.concatenate(courses) if courses else np.zeros(0, dtype=np.int64)),
+        ]:
+            np.save(os.path.join(tmp_directory, f"courses_inverted_index_{array_name}.npy"), array)
+
+        with open(os.path.join(tmp_directory, "metadata.json"), "w") as f:
+            json.dump(metadata, f)
+        try:
+            os.rename(tmp_directory, directory)
+        except OSError:
+            # another process saved the same dataset in the meantime
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+
+    @profiler.profiled
+    def load_cache(self):
+        """Load the data and its indexes from the cache directory if it exists. If mmap is true in the config, the jobs and
+        courses matrices and the indexes are read-only np.memmap views of the files of the cache, so the processes that load
+        the same dataset share their memory through the page cache of the OS. The learners are always loaded in memory
+        because they are updated
+
+        Returns:
+            bool: whether the data was loaded from the cache
+        """
+        directory = self.get_cache_directory()
+        if directory is None or not os.path.isdir(directory):
+            return False
+
+        with open(os.path.join(directory, "metadata.json")) as f:
+            metadata = json.load(f)
+        self.rng = random.Random(self.config["seed"])
+        self.skills = set(metadata["skills"])
+        self.skills2int = {k: v for k, v in metadata["skills2int"]}
+        self.mastery_levels = metadata["mastery_levels"]
+        self.max_learner_skills = metadata["max_learner_skills"]
+
+        for name in ["learners", "jobs", "courses"]:
+            shape = metadata["shapes"][name]
+            mmap_mode = None
+            if self.config.get("mmap", False) and name != "learners":
+                mmap_mode = "r"
+            if self.config.get("sparse", False):
+                arrays = [
+                    np.load(
+                        os.path.join(directory, f"{name}_{array_name}.npy"),
+                        mmap_mode=mmap_mode,
+                    )
+                    for array_name in ["indptr", "indices", "data"]
+                ]
+                setattr(self, name, SkillMatrix(*arrays, shape))
+            else:
+                setattr(
+                    self,
+                    name,
+                    np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode),
+                )
+
+            # the index maps the row to the id and the id to the row
+            setattr(
+                self,
+                f"{name}_index",
+                IdIndex(np.load(os.path.join(directory, f"{name}_ids.npy"))),
+            )
+
+        mmap_mode = "r" if self.config.get("mmap", False) else None
+        for name in self.cached_indexes:
+            index = dict(metadata["indexes"][name]["integers"])
+            for key in metadata["indexes"][name]["arrays"]:
+                index[key] = np.load(
+                    os.path.join(directory, f"{name}_{key}.npy"), mmap_mode=mmap_mode
+                )
+            setattr(self, name, index)
+        # number of jobs that require each skill, used to compute the attractiveness of the learners
+        self.jobs_per_skill = np.diff(self.jobs_inverted_index["indptr"])
+
+        skills, indptr, courses = [
+            np.load(
+                os.path.join(directory, f"courses_inverted_index_{array_name}.npy"),
+                mmap_mode=mmap_mode,
+            )
+            for array_name in ["skills", "indptr", "courses"]
+        ]
+        self.courses_inverted_index = {
+            skill: courses[indptr[i] : indptr[i + 1]]
+            for i, skill in enumerate(skills.tolist())
+        }
+        return True
+
+    @profiler.profiled
     def load_skills(self):
+        # imported here because pandas is slow to import and only needed when the dataset is not loaded from the cache
+        import pandas as pd
+
         # load the skills from the taxonomy file
         self.skills = pd.read_csv(self.config["taxonomy_path"])
 
@@ -62,163 +371,239 @@ class Dataset:
             self.skills = set(self.skills["unique_id"])
             self.skills2int = {skill: i for i, skill in enumerate(self.skills)}
 
+    @profiler.profiled
     def load_mastery_levels(self):
         """Load the mastery levels from the file specified in the config and store it in the class attribute"""
         self.mastery_levels = json.load(open(self.config["mastery_levels_path"]))
+        # the levels are stored as LEVEL_DTYPE in the matrices
+        max_level = np.iinfo(LEVEL_DTYPE).max
+        for name, level in self.mastery_levels.items():
+            if level != -1 and not 0 <= level <= max_level:
+                raise ValueError(
+                    f"The mastery level {name} is {level}, the levels must be between 0 and {max_level} (or -1 for unknown)"
+                )
+
+    def get_avg_levels(self, skill_lists, replace_unk):
+        """Get the mastery levels of a chunk of records at once. The mastery levels that are not in the mastery levels file
+        are ignored, the unknown levels are replaced by replace_unk, and the levels of the same skill in a record are averaged
+        and rounded (half to even, as round) because on our dataset we can have multiple mastery levels for the same skill
+
+        Args:
+            skill_lists (list): the list of [skill, mastery level] pairs of each record
+            replace_unk (int): The value to replace the unknown mastery levels
+
+        Returns:
+            tuple: the sorted flat keys record * nb_skills + skill of the skills of the records and their mastery levels
+        """
+        elements = [
+            (row, self.skills2int[skill], self.mastery_levels[mastery_level])
+            for row, skill_list in enumerate(skill_lists)
+            for skill, mastery_level in skill_list
+            if isinstance(mastery_level, str) and mastery_level in self.mastery_levels
+        ]
+        rows, skills, levels = np.array(elements, dtype=np.int64).reshape(-1, 3).T
+        levels[levels == -1] = replace_unk
+
+        # the sums of the levels are exact, so the averages are the same as with the sum of a list divided by its length
+        keys, inverse = np.unique(rows * len(self.skills) + skills, return_inverse=True)
+        sums = np.bincount(inverse, weights=levels, minlength=len(keys))
+        counts = np.bincount(inverse, minlength=len(keys))
+        return keys, np.rint(sums / counts).astype(LEVEL_DTYPE)
 
     def get_avg_skills(self, skill_list, replace_unk):
-        avg_skills = defaultdict(list)
-        for skill, mastery_level in skill_list:
-            # if the mastery level is a string and is in the mastery levels, we replace it with the corresponding value, otherwise we do nothing and continue to the next skill
-            if isinstance(mastery_level, str) and mastery_level in self.mastery_levels:
-                mastery_level = self.mastery_levels[mastery_level]
-                if mastery_level == -1:
-                    mastery_level = replace_unk
-                skill = self.skills2int[skill]
-                avg_skills[skill].append(mastery_level)
-        # we take the average of the mastery levels for each skill because on our dataset we can have multiple mastery levels for the same skill
-        for skill in avg_skills.keys():
-            avg_skills[skill] = sum(avg_skills[skill]) / len(avg_skills[skill])
-            avg_skills[skill] = round(avg_skills[skill])
-
-        return avg_skills
+        """Get the mastery levels of a single record, with the rules of get_avg_levels
+
+        Args:
+            skill_list (list): list of [skill, mastery level] pairs
+            replace_unk (int): The value to replace the unknown mastery levels
+
+        Returns:
+            dict: the mastery level of each skill of the record
+        """
+        skills, levels = self.get_avg_levels([skill_list], replace_unk)
+        return dict(zip(skills.tolist(), levels.tolist()))
+
+    def iter_records(self, path):
+        """Iterate over the (id, record) pairs of a json file without building the dictionary of the whole file when possible:
+        a .jsonl file is read line by line (each line is a json object with one or more id: record pairs) and a .json file is
+        parsed incrementally with ijson if it is installed, otherwise it is loaded with json.load
 
+        Args:
+            path (str): path of the json or jsonl file
+
+        Yields:
+            tuple: the id and the record
+        """
+        if path.endswith(".jsonl"):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        yield from json.loads(line).items()
+        elif ijson is not None:
+            with open(path, "rb") as f:
+                yield from ijson.kvitems(f, "", use_float=True)
+        else:
+            with open(path) as f:
+                yield from json.load(f).items()
+
+    @profiler.profiled
     def load_learners(self, replace_unk=1):
         """Load the learners from the file specified in the config and store it in the class attribute
 
         Args:
             replace_unk (int, optional): The value to replace the unknown mastery levels. Defaults to 1.
         """
-        learners = json.load(open(self.config["cv_path"]))
         self.max_learner_skills = self.config["max_cv_skills"]
-        self.learners_index = dict()
-
-        # numpy array to store the learners skill proficiency levels with default value 0
-        self.learners = np.zeros((len(learners), len(self.skills)), dtype=int)
-        index = 0
+        # the ids of the learners of each chunk
+        ids = []
 
-        # fill the numpy array with the learners skill proficiency levels from the json file
-        for learner_id, learner in learners.items():
+        nb_skills = len(self.skills)
 
-            avg_learner = self.get_avg_skills(learner, replace_unk)
+        # the rows of the learners skill proficiency levels, the skills that are not in a row have the default value 0
+        def chunks():
+            # the learners are read from the json file and converted into skill matrices chunk by chunk
+            for chunk in self.iter_chunks(self.iter_records(self.config["cv_path"])):
+                keys, levels = self.get_avg_levels(
+                    [learner for _, learner in chunk], replace_unk
+                )
 
-            # if the number of skills is greater than the max_learner_skills, we skip the learner
-            if len(avg_learner) > self.max_learner_skills:
-                continue
+                # if the number of skills is greater than the max_learner_skills, we skip the learner
+                rows = keys // nb_skills
+                kept = np.bincount(rows, minlength=len(chunk)) <= self.max_learner_skills
+                kept_elements = np.flatnonzero(kept[rows])
+                # the kept learners are numbered in the order of the file
+                new_rows = np.cumsum(kept) - 1
+                keys = new_rows[rows[kept_elements]] * nb_skills + keys[kept_elements] % nb_skills
 
-            # we fill the numpy array with the averaged mastery levels
-            for skill, level in avg_learner.items():
-                self.learners[index][skill] = level
+                ids.append([chunk[row][0] for row in np.flatnonzero(kept).tolist()])
 
-            self.learners_index[index] = learner_id
-            self.learners_index[learner_id] = index
+                yield int(kept.sum()), keys, levels[kept_elements]
 
-            index += 1
-
-        # we update the learners numpy array with the correct number of rows
-        self.learners = self.learners[:index]
+        self.learners = self.get_skill_matrix(chunks(), (nb_skills,))
+        self.learners_index = IdIndex.from_chunks(ids)
 
+    @profiler.profiled
     def load_jobs(self, replace_unk=3):
         """Load the jobs from the file specified in the config and store it in the class attribute
 
         Args:
             replace_unk (int, optional): The value to replace the unknown mastery levels. Defaults to 3.
         """
-        jobs = json.load(open(self.config["job_path"]))
-        self.jobs = np.zeros((len(jobs), len(self.skills)), dtype=int)
-        self.jobs_index = dict()
-        index = 0
-        for job_id, job in jobs.items():
-            self.jobs_index[index] = job_id
-            self.jobs_index[job_id] = index
-            avg_job = self.get_avg_skills(job, replace_unk)
-
-            for skill, level in avg_job.items():
-                self.jobs[index][skill] = level
-            index += 1
+        ids = []
+
+        def chunks():
+            for chunk in self.iter_chunks(self.iter_records(self.config["job_path"])):
+                ids.append([job_id for job_id, _ in chunk])
+                keys, levels = self.get_avg_levels([job for _, job in chunk], replace_unk)
+                yield len(chunk), keys, levels
+
+        self.jobs = self.get_skill_matrix(chunks(), (len(self.skills),))
+        self.jobs_index = IdIndex.from_chunks(ids)
 
+    @profiler.profiled
     def load_courses(self, replace_unk=2):
         """Load the courses from the file specified in the config and store it in the class attribute
 
         Args:
             replace_unk (int, optional): The value to replace the unknown mastery levels. Defaults to 2.
         """
-        courses = json.load(open(self.config["course_path"]))
-        self.courses = np.zeros((len(courses), 2, len(self.skills)), dtype=int)
-        self.courses_index = dict()
-        index = 0
-        for course_id, course in courses.items():
-            # if the course does not provide any skills, we skip it
-            if "to_acquire" not in course:
-                continue
-
-            self.courses_index[course_id] = index
-            self.courses_index[index] = course_id
-
-            avg_provided = self.get_avg_skills(course["to_acquire"], replace_unk)
-            for skill, level in avg_provided.items():
-                self.courses[index][1][skill] = level
-
-            if "required" in course:
-                avg_required = self.get_avg_skills(course["required"], replace_unk)
-                for skill, level in avg_required.items():
-                    self.courses[index][0][skill] = level
-
-            index += 1
-        # update the courses numpy array with the correct number of rows
-        self.courses = self.courses[:index]
+        nb_skills = len(self.skills)
+        ids = []
 
+        # the required skills of a course are at position skill and the provided skills at position nb_skills + skill
+        def chunks():
+            # if the course does not provide any skills, we skip it
+            courses = (
+                (course_id, course)
+                for course_id, course in self.iter_records(self.config["course_path"])
+                if "to_acquire" in course
+            )
+            for chunk in self.iter_chunks(courses):
+                # the required and provided skills of the course i are the records 2 * i and 2 * i + 1, so their keys are
+                # also the flat keys of the courses matrix
+                ids.append([course_id for course_id, _ in chunk])
+                skill_lists = []
+                for _, course in chunk:
+                    skill_lists.append(course.get("required", []))
+                    skill_lists.append(course["to_acquire"])
+                keys, levels = self.get_avg_levels(skill_lists, replace_unk)
+                yield len(chunk), keys, levels
+
+        # create the courses matrix with the correct number of rows
+        self.courses = self.get_skill_matrix(chunks(), (2, nb_skills))
+        self.courses_index = IdIndex.from_chunks(ids)
+
+    @profiler.profiled
     def get_subsample(self):
         """Get a subsample of the dataset based on the config parameters"""
         random.seed(self.config["seed"])
-        if self.config["nb_cvs"] != -1:
-            # get a random sample of self.config["nb_cvs"] of ids from 0 to len(self.learners)
-            learners_ids = random.sample(
-                range(len(self.learners)), self.config["nb_cvs"]
-            )
-            # update the learners numpy array and the learners_index dictionary with the sampled ids
-            self.learners = self.learners[learners_ids]
-            self.learners_index = {
-                i: self.learners_index[index] for i, index in enumerate(learners_ids)
-            }
-            self.learners_index.update({v: k for k, v in self.learners_index.items()})
-        if self.config["nb_jobs"] != -1:
-            jobs_ids = random.sample(range(len(self.jobs)), self.config["nb_jobs"])
-            self.jobs = self.jobs[jobs_ids]
-            self.jobs_index = {
-                i: self.jobs_index[index] for i, index in enumerate(jobs_ids)
-            }
-            self.jobs_index.update({v: k for k, v in self.jobs_index.items()})
-        if self.config["nb_courses"] != -1:
-            courses_ids = random.sample(
-                range(len(self.courses)), self.config["nb_courses"]
+        for name, size in [
+            ("learners", self.config["nb_cvs"]),
+            ("jobs", self.config["nb_jobs"]),
+            ("courses", self.config["nb_courses"]),
+        ]:
+            if size == -1:
+                continue
+            # get a random sample of size rows from 0 to the number of rows, the sample is the same as with the lists of rows
+            rows = np.array(
+                random.sample(range(len(getattr(self, name))), size), dtype=np.int64
             )
-            self.courses = self.courses[courses_ids]
-            self.courses_index = {
-                i: self.courses_index[index] for i, index in enumerate(courses_ids)
-            }
-            self.courses_index.update({v: k for k, v in self.courses_index.items()})
+            # the matrix and the ids of its rows are selected with the same array of rows
+            setattr(self, name, getattr(self, name)[rows])
+            setattr(self, f"{name}_index", getattr(self, f"{name}_index").select(rows))
 
+    @profiler.profiled
     def make_course_consistent(self):
         """Make the courses consistent by removing the skills that are provided and required at the same time"""
-        for course in self.courses:
-            for skill_id in range(len(self.skills)):
-                required_level = course[0][skill_id]
-                provided_level = course[1][skill_id]
-                if provided_level != 0 and provided_level <= required_level:
-                    if provided_level == 1:
-                        course[0][skill_id] = 0
-                    else:
-                        course[0][skill_id] = provided_level - 1
-
+        if isinstance(self.courses, SkillMatrix):
+            self.make_sparse_course_consistent()
+            return
+
+        required_levels = self.courses[:, 0]
+        provided_levels = self.courses[:, 1]
+        inconsistent = (provided_levels != 0) & (provided_levels <= required_levels)
+        # the required level becomes provided_level - 1, that is 0 (the skill is removed) if the provided level is 1
+        required_levels[inconsistent] = provided_levels[inconsistent] - 1
+
+    def make_sparse_course_consistent(self):
+        """Apply the rule of make_course_consistent directly on the non zero elements of the courses stored as a SkillMatrix"""
+        nb_skills = len(self.skills)
+        rows, positions = self.courses.nonzero()
+        data = self.courses.data
+        required = positions < nb_skills
+
+        # key of each element, the keys are sorted because the rows and the positions within a row are sorted
+        required_keys = rows[required] * nb_skills + positions[required]
+        provided_keys = rows[~required] * nb_skills + positions[~required] - nb_skills
+
+        # find the provided level of the skills that are also required by the course (0 if they are not provided)
+        required_levels = data[required]
+        provided_levels = np.zeros_like(required_levels)
+        if len(provided_keys) > 0:
+            found = np.searchsorted(provided_keys, required_keys)
+            found = np.minimum(found, len(provided_keys) - 1)
+            is_provided = provided_keys[found] == required_keys
+            provided_levels[is_provided] = data[~required][found[is_provided]]
+
+        inconsistent = (provided_levels != 0) & (provided_levels <= required_levels)
+        # the required level becomes provided_level - 1, that is 0 (the skill is removed) if the provided level is 1
+        required_levels[inconsistent] = provided_levels[inconsistent] - 1
+        data[required] = required_levels
+        self.courses.eliminate_zeros()
+
+    @profiler.profiled
     def get_jobs_inverted_index(self):
-        """Get the inverted index for the jobs. The inverted index is a dictionary that maps the skill to the jobs that require it"""
-        self.jobs_inverted_index = defaultdict(set)
-        for i, job in enumerate(self.jobs):
-            for skill, level in enumerate(job):
-                if level > 0:
-                    self.jobs_inverted_index[skill].add(i)
+        """Get the matching index of the jobs and the inverted index for the jobs. The inverted index is the skill x job matrix
+        in CSR format: the jobs that require the skill s are jobs_inverted_index["targets"][indptr[s] : indptr[s + 1]], with
+        their levels and weights for the matchings"""
+        self.jobs_matching_index = matchings.get_matching_index(self.jobs)
+        self.jobs_inverted_index = matchings.transpose_matching_index(
+            self.jobs_matching_index, len(self.skills)
+        )
+        # number of jobs that require each skill, used to compute the attractiveness of the learners
+        self.jobs_per_skill = np.diff(self.jobs_inverted_index["indptr"])
 
+    @profiler.profiled
     def get_nb_applicable_jobs(self, learner, threshold):
         """Get the number of applicable jobs for a learner
 
@@ -229,19 +614,38 @@ class Dataset:
         Returns:
             int: the number of applicable jobs
         """
-        nb_applicable_jobs = 0
-        jobs_subset = set()
+        return int(self.get_batch_nb_applicable_jobs([learner], threshold)[0])
 
-        # get the index of the non zero elements in the learner array
-        skills = np.nonzero(learner)[0]
+    @profiler.profiled
+    def get_batch_nb_applicable_jobs(self, learners, threshold, batch_size=1024):
+        """Get the number of applicable jobs for each learner of a matrix of learners
 
-        for skill in skills:
-            if skill in self.jobs_inverted_index:
-                jobs_subset.update(self.jobs_inverted_index[skill])
-        for job_id in jobs_subset:
-            matching = matchings.learner_job_matching(learner, self.jobs[job_id])
-            if matching >= threshold:
-                nb_applicable_jobs += 1
+        Args:
+            learners (np.array): matrix of skills and mastery levels of the learners
+            threshold (float): the threshold for the matching
+            batch_size (int, optional): number of learners matched at once against all the jobs. Defaults to 1024.
+
+        Returns:
+            np.array: the number of applicable jobs of each learner
+        """
+        nb_applicable_jobs = np.zeros(len(learners), dtype=int)
+        index = self.jobs_matching_index
+        for start in range(0, len(learners), batch_size):
+            # only one block of learners is dense at a time when they are stored as a SkillMatrix
+            block = np.asarray(learners[start : start + batch_size])
+            # only the jobs that share a skill with a learner can be applicable, they are found with the inverted index,
+            # and the jobs that share too few skills with the learner to reach the threshold are pruned before the matching
+            rows, jobs, sums, _ = matchings.overlap_matching_sums(
+                block,
+                self.jobs_inverted_index,
+                index["nb_targets"],
+                threshold,
+                index["counts"],
+            )
+            applicable = matchings.is_applicable(block, rows, jobs, sums, index, threshold)
+            nb_applicable_jobs[start : start + batch_size] = np.bincount(
+                rows[applicable], minlength=len(block)
+            )
         return nb_applicable_jobs
 
     def get_avg_applicable_jobs(self, threshold):
@@ -253,12 +657,106 @@ class Dataset:
         Returns:
             float: the average number of applicable jobs
         """
-        avg_applicable_jobs = 0
-        for learner in self.learners:
-            avg_applicable_jobs += self.get_nb_applicable_jobs(learner, threshold)
-        avg_applicable_jobs /= len(self.learners)
-        return avg_applicable_jobs
+        return float(self.get_batch_nb_applicable_jobs(self.learners, threshold).mean())
+
+    @profiler.profiled
+    def get_courses_index(self):
+        """Get the matching indexes of the required and provided skills of the courses and the inverted index of the courses,
+        a dictionary that maps each skill to the array of courses that require or provide it"""
+        if isinstance(self.courses, SkillMatrix):
+            required, provided = self.courses.get_part(0), self.courses.get_part(1)
+        else:
+            required, provided = self.courses[:, 0], self.courses[:, 1]
+        self.required_matching_index = matchings.get_matching_index(required)
+        self.provided_matching_index = matchings.get_matching_index(provided)
+
+        courses = np.concatenate(
+            [self.required_matching_index["rows"], self.provided_matching_index["rows"]]
+        )
+        skills = np.concatenate(
+            [
+                self.required_matching_index["skills"],
+                self.provided_matching_index["skills"],
+            ]
+        )
+        # group the courses by skill
+        order = np.argsort(skills, kind="stable")
+        skills, courses = skills[order], courses[order]
+        unique_skills, starts = np.unique(skills, return_index=True)
+        self.courses_inverted_index = {
+            skill: np.unique(skill_courses)
+            for skill, skill_courses in zip(
+                unique_skills.tolist(), np.split(courses, starts[1:])
+            )
+        }
+
+    @profiler.profiled
+    def get_batch_enrollable_courses(self, learners, threshold, courses_ids=None):
+        """Get the enrollability of every course for each learner of a matrix of learners
 
+        Args:
+            learners (np.array): matrix of skills and mastery levels of the learners
+            threshold (float): the threshold for the matching
+            courses_ids (np.array, optional): indices of the courses to evaluate. Defaults to None (all the courses).
+
+        Returns:
+            tuple: boolean matrix of shape (nb_learners, nb_courses) that is true if the learner can enroll in the course,
+                and matrix of the same shape with the score required_matching * (1 - provided_matching) of each course
+        """
+        required_index = self.required_matching_index
+        provided_index = self.provided_matching_index
+        if courses_ids is not None:
+            required_index = matchings.select_matching_index(required_index, courses_ids)
+            provided_index = matchings.select_matching_index(provided_index, courses_ids)
+
+        required_matching, provided_matching = matchings.batch_course_matchings(
+            np.asarray(learners), required_index, provided_index
+        )
+
+        # a course that does not provide any skill can not be taken
+        enrollable = (
+            (required_matching >= threshold)
+            & (provided_matching < 1.0)
+            & (provided_index["counts"] > 0)
+        )
+        scores = required_matching * (1 - provided_matching)
+        return enrollable, scores
+
+    @profiler.profiled
+    def update_enrollable_courses(
+        self, learner, enrollable, scores, changed_skills, threshold
+    ):
+        """Update the enrollability of the courses for a learner whose levels changed on some skills. Only the courses that
+        require or provide one of the changed skills are evaluated again
+
+        Args:
+            learner (list): list of skills and mastery level of the learner after the change
+            enrollable (np.array): enrollability of each course before the change
+            scores (np.array): score of each course before the change
+            changed_skills (list): skills whose level changed
+            threshold (float): the threshold for the matching
+
+        Returns:
+            tuple: updated copies of enrollable and scores
+        """
+        enrollable, scores = enrollable.copy(), scores.copy()
+        touched_courses = [
+            self.courses_inverted_index[skill]
+            for skill in changed_skills
+            if skill in self.courses_inverted_index
+        ]
+        if not touched_courses:
+            return enrollable, scores
+
+        touched_courses = np.unique(np.concatenate(touched_courses))
+        touched_enrollable, touched_scores = self.get_batch_enrollable_courses(
+            [learner], threshold, touched_courses
+        )
+        enrollable[touched_courses] = touched_enrollable[0]
+        scores[touched_courses] = touched_scores[0]
+        return enrollable, scores
+
+    @profiler.profiled
     def get_all_enrollable_courses(self, learner, threshold):
         """Get all the enrollable courses for a learner
 
@@ -269,18 +767,10 @@ class Dataset:
         Returns:
             dict: dictionary of enrollable courses
         """
-        enrollable_courses = {}
-        for i, course in enumerate(self.courses):
-            required_matching = matchings.learner_course_required_matching(
-                learner, course
-            )
-            provided_matching = matchings.learner_course_provided_matching(
-                learner, course
-            )
-            if required_matching >= threshold and provided_matching < 1.0:
-                enrollable_courses[i] = course
-        return enrollable_courses
+        enrollable, _ = self.get_batch_enrollable_courses([learner], threshold)
+        return {i: self.courses[i] for i in np.flatnonzero(enrollable[0])}
 
+    @profiler.profiled
     def get_learner_attractiveness(self, learner):
         """Get the attractiveness of a learner
 
@@ -290,15 +780,27 @@ class Dataset:
         Returns:
             int: number of jobs that require at least one of the learner's skills
         """
-        attractiveness = 0
-
         # get the index of the non zero elements in the learner array
         skills = np.nonzero(learner)[0]
 
-        for skill in skills:
-            if skill in self.jobs_inverted_index:
-                attractiveness += len(self.jobs_inverted_index[skill])
-        return attractiveness
+        return int(self.jobs_per_skill[skills].sum())
+
+    @profiler.profiled
+    def get_batch_learner_attractiveness(self, learners):
+        """Get the attractiveness of each learner of a matrix of learners
+
+        Args:
+            learners (np.array): matrix of skills and mastery levels of the learners
+
+        Returns:
+            np.array: number of jobs that require at least one of the skills of each learner
+        """
+        if isinstance(learners, SkillMatrix):
+            rows, skills = learners.nonzero()
+            return np.bincount(
+                rows, weights=self.jobs_per_skill[skills], minlength=len(learners)
+            ).astype(int)
+        return (np.asarray(learners) > 0) @ self.jobs_per_skill
 
     def get_avg_learner_attractiveness(self):
         """Get the average attractiveness of all the learners
@@ -306,8 +808,4 @@ class Dataset:
         Returns:
             float: the average attractiveness of the learners
         """
-        attractiveness = 0
-        for learner in self.learners:
-            attractiveness += self.get_learner_attractiveness(learner)
-        attractiveness /= len(self.learners)
-        return attractiveness
+        return float(self.get_batch_learner_attractiveness(self.learners).mean())
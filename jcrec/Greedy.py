@@ -1,10 +1,11 @@
 import os
 import json
 
-from time import process_time
-
 import numpy as np
 
+import parallel
+import profiler
+
 
 class Greedy:
     def __init__(self, dataset, threshold):
@@ -21,6 +22,7 @@ class Greedy:
         learner = np.maximum(learner, course[1])
         return learner
 
+    @profiler.profiled
     def get_course_recommendation(self, learner, enrollable_courses):
         """Return the greedy recommendation for the learner
 
@@ -35,15 +37,23 @@ class Greedy:
         max_nb_applicable_jobs = 0
         max_attractiveness = 0
 
-        for id_c, course in enrollable_courses.items():
-            tmp_learner = learner
-            tmp_learner = self.update_learner_profile(tmp_learner, course)
-
-            nb_applicable_jobs = self.dataset.get_nb_applicable_jobs(
-                tmp_learner, self.threshold
-            )
-            attractiveness = self.dataset.get_learner_attractiveness(tmp_learner)
-
+        # Score all the courses at once: the learner after each course is matched with the jobs in one batch
+        courses_ids = list(enrollable_courses)
+        if not courses_ids:
+            return course_recommendation
+        tmp_learners = np.maximum(
+            np.asarray(learner), np.asarray(self.dataset.courses[courses_ids])[:, 1]
+        )
+        all_nb_applicable_jobs = self.dataset.get_batch_nb_applicable_jobs(
+            tmp_learners, self.threshold
+        ).tolist()
+        all_attractiveness = self.dataset.get_batch_learner_attractiveness(
+            tmp_learners
+        ).tolist()
+
+        for id_c, nb_applicable_jobs, attractiveness in zip(
+            courses_ids, all_nb_applicable_jobs, all_attractiveness
+        ):
             # Select the course that maximizes the number of applicable jobs
 
             if nb_applicable_jobs > max_nb_applicable_jobs:
@@ -85,6 +95,19 @@ class Greedy:
         )
         return course_recommendation
 
+    @profiler.profiled
+    def recommend_sequence_and_update(self, learner_id, k):
+        """Make k greedy recommendations to the learner and update the learner profile
+
+        Args:
+            learner_id (int): index of the learner
+            k (int): number of recommendations to make
+
+        Returns:
+            list: the ids of the courses recommended
+        """
+        return [self.recommend_and_update(learner_id) for _ in range(k)]
+
     def greedy_recommendation(self, k, run):
         """Make k greedy recommendations for each learner and save the results in a json file
 
@@ -104,20 +127,24 @@ class Greedy:
 
         results["original_applicable_jobs"] = avg_app_j
 
-        time_start = process_time()
+        time_start = parallel.cpu_time()
         recommendations = dict()
 
-        for i, learner in enumerate(self.dataset.learners):
+        # the learners are processed in parallel if nb_workers > 1 in the config
+        recommendation_sequences = parallel.recommend_learners(
+            self,
+            "recommend_sequence_and_update",
+            k,
+            self.dataset.config.get("nb_workers", 1),
+            self.dataset.config.get("chunk_size", 16),
+        )
+        for i, recommendation_sequence in enumerate(recommendation_sequences):
             index = self.dataset.learners_index[i]
-            recommendation_sequence = []
-            for _ in range(k):
-                recommendation_sequence.append(self.recommend_and_update(i))
-            recommendations[index] = [
-                self.dataset.courses_index[course_id]
-                for course_id in recommendation_sequence
-            ]
-
-        time_end = process_time()
+            recommendations[index] = self.dataset.courses_index.get_ids(
+                recommendation_sequence
+            )
+
+        time_end = parallel.cpu_time()
         avg_recommendation_time = (time_end - time_start) / len(self.dataset.learners)
 
         print(f"Average Recommendation Time: {avg_recommendation_time:.4f} seconds")
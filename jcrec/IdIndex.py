@@ -0,0 +1,81 @@
+import numpy as np
+
+
+class IdIndex:
+    # The IdIndex class maps the rows of the learners, jobs or courses matrices to the ids of the records in the files and back.
+    # The ids are stored in a numpy array in the order of the rows, and the row of each id is in a dictionary that is only
+    # built when an id is first looked up.
+    def __init__(self, ids):
+        """Create the index from the ids of the rows
+
+        Args:
+            ids (iterable): the id of each row, in the order of the rows
+        """
+        self.ids = np.asarray(ids, dtype=str)
+        # id -> row, built by get_row
+        self.rows = None
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """Create the index from the ids of consecutive chunks of rows
+
+        Args:
+            chunks (list): lists of ids
+
+        Returns:
+            IdIndex: the index
+        """
+        arrays = [np.asarray(chunk, dtype=str) for chunk in chunks]
+        return cls(np.concatenate(arrays) if arrays else np.zeros(0, dtype=str))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __str__(self):
+        return f"IdIndex of {len(self)} ids"
+
+    def __getitem__(self, row):
+        """Get the id of a row
+
+        Args:
+            row (int): index of the row
+
+        Returns:
+            str: the id of the row
+        """
+        return str(self.ids[row])
+
+    def get_ids(self, rows):
+        """Get the ids of several rows at once
+
+        Args:
+            rows (list): indices of the rows
+
+        Returns:
+            list: the id of each row
+        """
+        return self.ids[np.asarray(rows, dtype=np.int64)].tolist()
+
+    def get_row(self, record_id):
+        """Get the row of an id
+
+        Args:
+            record_id (str): the id of the record
+
+        Returns:
+            int: the index of its row
+        """
+        if self.rows is None:
+            self.rows = {value: row for row, value in enumerate(self.ids.tolist())}
+        return self.rows[record_id]
+
+    def select(self, rows):
+        """Get the index of a subset of the rows, as the matrices indexed with the same rows
+
+        Args:
+            rows (np.array): indices of the selected rows
+
+        Returns:
+            IdIndex: the index of the selected rows, the i-th row of the new index is rows[i]
+        """
+        return IdIndex(self.ids[np.asarray(rows, dtype=np.int64)])
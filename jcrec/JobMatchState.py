@@ -0,0 +1,125 @@
+import copy
+
+import numpy as np
+
+import matchings
+import profiler
+
+
+class JobMatchState:
+    # The JobMatchState class keeps the matching of one learner with every job. When the learner takes a course, only the
+    # jobs that require one of the skills improved by the course are updated, using the skill -> jobs index of the dataset.
+    @profiler.profiled
+    def __init__(self, dataset, learner, threshold):
+        self.dataset = dataset
+        self.threshold = threshold
+        self.learner = np.array(learner)
+        index = dataset.jobs_matching_index
+        self.scale = index["scale"]
+        self.counts = index["counts"]
+
+        # scaled sums of the level ratios of the learner with each job, see matchings.batch_matching_sums, only the jobs
+        # that share a skill with the learner have a non zero sum
+        _, jobs, sums, _ = matchings.overlap_matching_sums(
+            self.learner, dataset.jobs_inverted_index, index["nb_targets"]
+        )
+        self.sums = np.zeros(index["nb_targets"])
+        self.sums[jobs] = sums
+        self.applicable = np.zeros(index["nb_targets"], dtype=bool)
+        self.applicable[jobs] = matchings.is_applicable(
+            self.learner, np.zeros(len(jobs), dtype=np.int64), jobs, sums, index, threshold
+        )
+        self.nb_applicable_jobs = int(np.count_nonzero(self.applicable))
+        self.attractiveness = dataset.get_learner_attractiveness(self.learner)
+
+    def copy(self):
+        """Get an independent copy of the state
+
+        Returns:
+            JobMatchState: the copy
+        """
+        state = copy.copy(self)
+        state.learner = self.learner.copy()
+        state.sums = self.sums.copy()
+        state.applicable = self.applicable.copy()
+        return state
+
+    @profiler.profiled
+    def get_changes(self, course):
+        """Get the changes of the matching of the learner with the jobs if the learner takes the course
+
+        Args:
+            course (list): list of required (resp. provided) skills and mastery level of the course
+
+        Returns:
+            tuple: improved skills and their new levels, touched jobs and their new sums, new nb of applicable jobs and new attractiveness
+        """
+        new_levels = np.maximum(self.learner, course[1])
+        skills = np.flatnonzero(new_levels != self.learner)
+
+        # elements of the jobs that involve the improved skills
+        _, jobs, deltas = matchings.get_gain_elements(
+            skills, self.learner[skills], new_levels[skills], self.dataset.jobs_inverted_index
+        )
+
+        # sum the changes of each touched job and get their new matching
+        jobs, inverse = np.unique(jobs, return_inverse=True)
+        sums = self.sums[jobs] + np.bincount(inverse, weights=deltas, minlength=len(jobs))
+        applicable = matchings.is_applicable(
+            new_levels,
+            np.zeros(len(jobs), dtype=np.int64),
+            jobs,
+            sums,
+            self.dataset.jobs_matching_index,
+            self.threshold,
+        )
+        nb_applicable_jobs = (
+            self.nb_applicable_jobs
+            - int(np.count_nonzero(self.applicable[jobs]))
+            + int(np.count_nonzero(applicable))
+        )
+
+        # the attractiveness only changes with the skills that the learner did not have
+        new_skills = skills[self.learner[skills] == 0]
+        attractiveness = self.attractiveness + int(
+            self.dataset.jobs_per_skill[new_skills].sum()
+        )
+
+        return (
+            (skills, new_levels[skills]),
+            (jobs, sums, applicable),
+            nb_applicable_jobs,
+            attractiveness,
+        )
+
+    def evaluate(self, course):
+        """Get the number of applicable jobs and the attractiveness of the learner if they take the course, without updating the state
+
+        Args:
+            course (list): list of required (resp. provided) skills and mastery level of the course
+
+        Returns:
+            tuple: the number of applicable jobs and the attractiveness
+        """
+        _, _, nb_applicable_jobs, attractiveness = self.get_changes(course)
+        return nb_applicable_jobs, attractiveness
+
+    def update(self, course):
+        """Update the state when the learner takes the course
+
+        Args:
+            course (list): list of required (resp. provided) skills and mastery level of the course
+
+        Returns:
+            np.array: the updated learner
+        """
+        (
+            (skills, levels),
+            (jobs, sums, applicable),
+            self.nb_applicable_jobs,
+            self.attractiveness,
+        ) = self.get_changes(course)
+        self.learner[skills] = levels
+        self.sums[jobs] = sums
+        self.applicable[jobs] = applicable
+        return self.learner
@@ -1,10 +1,13 @@
 import os
 import json
 
-from time import time
-
 import numpy as np
 
+import matchings
+import parallel
+import profiler
+from JobMatchState import JobMatchState
+
 
 class Optimal:
     def __init__(self, dataset, threshold):
@@ -30,10 +33,10 @@ class Optimal:
         """
         learner = self.dataset.learners[learner_id]
         for id_c in course_list:
-            self.dataset.learners[learner_id] = self.update_learner_profile(
-                learner, self.dataset.courses[id_c]
-            )
+            learner = self.update_learner_profile(learner, self.dataset.courses[id_c])
+        self.dataset.learners[learner_id] = learner
 
+    @profiler.profiled
     def get_course_recommendation(
         self,
         learner,
@@ -48,7 +51,7 @@ class Optimal:
 
         Args:
             learner (list): list of skills and mastery level of the learner
-            enrollable_courses (dict): dictionary of courses that the learner can enroll in
+            enrollable_courses (tuple): enrollability and scores of the courses for the learner (see Dataset.get_batch_enrollable_courses)
             candiate_course_recommendation_list (list): list of candiate courses for the recommendation
             course_recommendations_list (list): optimal sequence of courses for the recommendation to be returned
             max_nb_applicable_jobs (int): current maximum number of applicable jobs given the recommendation list
@@ -86,20 +89,29 @@ class Optimal:
             )
         # Recursive case: for all courses that the learner can enroll in, get the optimal sequence of courses by calling the function recursively
         else:
-            enrollable_courses = self.dataset.get_all_enrollable_courses(
-                learner, self.threshold
-            )
-            for id_c, course in enrollable_courses.items():
+            enrollable, scores = enrollable_courses
+            for id_c in np.flatnonzero(enrollable):
+                course = self.dataset.courses[id_c]
                 tmp_learner = learner
                 tmp_learner = self.update_learner_profile(tmp_learner, course)
                 new_candidate_list = candiate_course_recommendation_list + [id_c]
+                # only the courses that involve the skills improved by the course need to be evaluated again
+                tmp_enrollable_courses = None
+                if k > 1:
+                    tmp_enrollable_courses = self.dataset.update_enrollable_courses(
+                        tmp_learner,
+                        enrollable,
+                        scores,
+                        np.flatnonzero(tmp_learner != learner),
+                        self.threshold,
+                    )
                 (
                     course_recommendations_list,
                     max_nb_applicable_jobs,
                     max_attractiveness,
                 ) = self.get_course_recommendation(
                     tmp_learner,
-                    enrollable_courses,
+                    tmp_enrollable_courses,
                     new_candidate_list,
                     course_recommendations_list,
                     max_nb_applicable_jobs,
@@ -113,6 +125,168 @@ class Optimal:
                 max_attractiveness,
             )
 
+    @profiler.profiled
+    def get_gain_bounds(self, job_match_state, k):
+        """Get an upper bound of the scaled matching sums that any r <= k courses can add to each job of a learner.
+        Taking a course adds to each job at most its gain for the initial learner, and the gains of several courses add up
+        at most, so the bound for r courses is the sum of the r largest gains of the courses for the job. A course only
+        changes the jobs that require a skill it improves, so the gains are computed on the inverted index of the jobs for
+        the provided skills of each course, as in JobMatchState.get_changes.
+
+        Args:
+            job_match_state (JobMatchState): matching state of the initial learner
+            k (int): maximum number of courses
+
+        Returns:
+            np.array: matrix of shape (k + 1, nb_jobs), the row r is the bound for r courses
+        """
+        learner = job_match_state.learner
+        nb_jobs = self.dataset.jobs_matching_index["nb_targets"]
+
+        # provided skills of each course above the level of the learner
+        index = self.dataset.provided_matching_index
+        improved = np.flatnonzero(index["levels"] > learner[index["skills"]])
+        skills = index["skills"][improved]
+        elements, jobs, deltas = matchings.get_gain_elements(
+            skills, learner[skills], index["levels"][improved], self.dataset.jobs_inverted_index
+        )
+
+        # sum the gains of each pair of a course and a job
+        keys = index["rows"][improved][elements] * nb_jobs + jobs
+        keys, inverse = np.unique(keys, return_inverse=True)
+        gains = np.bincount(inverse, weights=deltas, minlength=len(keys))
+        jobs = keys % nb_jobs
+
+        # keep the k largest gains of each job, in decreasing order, the other pairs have no gain
+        k = min(k, len(self.dataset.courses))
+        order = np.lexsort((-gains, jobs))
+        jobs, gains = jobs[order], gains[order]
+        ranks = np.arange(len(jobs)) - np.searchsorted(jobs, jobs)
+        kept = ranks < k
+        largest_gains = np.zeros((k, nb_jobs))
+        largest_gains[ranks[kept], jobs[kept]] = gains[kept]
+        bounds = np.zeros((k + 1, nb_jobs))
+        bounds[1:] = np.cumsum(largest_gains, axis=0)
+        return bounds
+
+    def get_nb_applicable_jobs_bound(self, job_match_state, gain_bounds):
+        """Get an upper bound of the number of applicable jobs that the learner can reach
+
+        Args:
+            job_match_state (JobMatchState): matching state of the learner
+            gain_bounds (np.array): upper bound of the scaled matching sums that the remaining courses can add to each job
+
+        Returns:
+            int: upper bound of the number of applicable jobs
+        """
+        matching = matchings.get_matching_from_sums(
+            job_match_state.sums + gain_bounds,
+            job_match_state.scale,
+            job_match_state.counts,
+        )
+        # the matchings of the jobs are rounded, so a job whose bound is just below the threshold can still be applicable
+        margin = matchings.get_matching_margin(job_match_state.counts)
+        return int(np.count_nonzero(matching >= self.threshold - margin))
+
+    @profiler.profiled
+    def search_course_recommendation(self, learner, k):
+        """Get the optimal sequence of courses for a learner with a branch-and-bound search. It returns the same sequence as
+        get_course_recommendation but:
+            - the sequences that lead to an already explored skill profile with the same number of remaining courses are
+              skipped, e.g. the permutations of the same set of courses, since the courses are applied with np.maximum
+            - the branches that can not reach the current maximum number of applicable jobs are pruned
+            - the enrollable courses and the applicable jobs are updated incrementally along the branches
+
+        Args:
+            learner (list): list of skills and mastery level of the learner
+            k (int): number of courses to recommend
+
+        Returns:
+            tuple: optimal sequence of courses for the recommendation, maximum number of applicable jobs, maximum attractiveness
+        """
+        job_match_state = JobMatchState(self.dataset, learner, self.threshold)
+        gain_bounds = self.get_gain_bounds(job_match_state, k)
+        enrollable, scores = self.dataset.get_batch_enrollable_courses(
+            [learner], self.threshold
+        )
+        # best sequence, number of applicable jobs and attractiveness, updated with the same rule as get_course_recommendation
+        best = [None, 0, 0]
+        # explored pairs of (skill profile, number of remaining courses)
+        explored = set()
+
+        def update_best(candidate_list, nb_applicable_jobs, attractiveness):
+            if nb_applicable_jobs > best[1] or (
+                nb_applicable_jobs == best[1] and attractiveness > best[2]
+            ):
+                best[:] = [candidate_list, nb_applicable_jobs, attractiveness]
+
+        def explore(job_match_state, enrollable, scores, candidate_list, k):
+            # The sequences are explored in the same order as get_course_recommendation, so when a skill profile is
+            # reached again, the first visit already found the best sequence of its branch for the tie-breaking rule
+            profiler.count("Optimal.nodes")
+            if self.get_nb_applicable_jobs_bound(
+                job_match_state, gain_bounds[min(k, len(gain_bounds) - 1)]
+            ) < best[1]:
+                profiler.count("Optimal.pruned_nodes")
+                return
+
+            courses_ids = np.flatnonzero(enrollable)
+            if k == 1:
+                profiler.count("Optimal.leaves", len(courses_ids))
+                # the last course of the sequences: score all the enrollable courses in one shot
+                tmp_learners = np.maximum(
+                    job_match_state.learner,
+                    np.asarray(self.dataset.courses[courses_ids])[:, 1],
+                )
+                all_nb_applicable_jobs = self.dataset.get_batch_nb_applicable_jobs(
+                    tmp_learners, self.threshold
+                )
+                all_attractiveness = self.dataset.get_batch_learner_attractiveness(
+                    tmp_learners
+                )
+                for id_c, tmp_learner, nb_applicable_jobs, attractiveness in zip(
+                    courses_ids, tmp_learners, all_nb_applicable_jobs, all_attractiveness
+                ):
+                    key = (tmp_learner.tobytes(), 0)
+                    if key not in explored:
+                        explored.add(key)
+                        update_best(
+                            candidate_list + [id_c], nb_applicable_jobs, attractiveness
+                        )
+                return
+
+            for id_c in courses_ids:
+                course = self.dataset.courses[id_c]
+                tmp_learner = self.update_learner_profile(job_match_state.learner, course)
+                key = (tmp_learner.tobytes(), k - 1)
+                if key in explored:
+                    profiler.count("Optimal.explored_profiles")
+                    continue
+                explored.add(key)
+
+                tmp_job_match_state = job_match_state.copy()
+                tmp_job_match_state.update(course)
+                tmp_enrollable, tmp_scores = self.dataset.update_enrollable_courses(
+                    tmp_learner,
+                    enrollable,
+                    scores,
+                    np.flatnonzero(tmp_learner != job_match_state.learner),
+                    self.threshold,
+                )
+                explore(
+                    tmp_job_match_state,
+                    tmp_enrollable,
+                    tmp_scores,
+                    candidate_list + [id_c],
+                    k - 1,
+                )
+
+        if k == 0:
+            update_best([], job_match_state.nb_applicable_jobs, job_match_state.attractiveness)
+        else:
+            explore(job_match_state, enrollable[0], scores[0], [], k)
+        return tuple(best)
+
     def recommend_and_update(self, learner_id, k):
         """Recommend a sequence of courses to the learner and update the learner profile
 
@@ -123,26 +297,12 @@ class Optimal:
         Returns:
             list: optimal sequence of courses for the recommendation
         """
-        enrollable_courses = None
-        candiate_course_recommendation_list = []
-        course_recommendations_list = None
-        max_nb_applicable_jobs = 0
-        max_attractiveness = 0
         learner = self.dataset.learners[learner_id]
-
         (
             course_recommendations_list,
             max_nb_applicable_jobs,
             max_attractiveness,
-        ) = self.get_course_recommendation(
-            learner,
-            enrollable_courses,
-            candiate_course_recommendation_list,
-            course_recommendations_list,
-            max_nb_applicable_jobs,
-            max_attractiveness,
-            k,
-        )
+        ) = self.search_course_recommendation(learner, k)
         self.update_learner_profile_list(learner_id, course_recommendations_list)
         return course_recommendations_list
 
@@ -165,18 +325,25 @@ class Optimal:
 
         results["original_applicable_jobs"] = avg_app_j
 
-        time_start = time()
+        time_start = parallel.cpu_time()
         recommendations = dict()
-        for i, learner in enumerate(self.dataset.learners):
+
+        # the learners are processed in parallel if nb_workers > 1 in the config
+        recommendation_sequences = parallel.recommend_learners(
+            self,
+            "recommend_and_update",
+            k,
+            self.dataset.config.get("nb_workers", 1),
+            self.dataset.config.get("chunk_size", 16),
+        )
+        for i, recommendation_sequence in enumerate(recommendation_sequences):
             index = self.dataset.learners_index[i]
-            recommendation_sequence = self.recommend_and_update(i, k)
 
-            recommendations[index] = [
-                self.dataset.courses_index[course_id]
-                for course_id in recommendation_sequence
-            ]
+            recommendations[index] = self.dataset.courses_index.get_ids(
+                recommendation_sequence
+            )
 
-        time_end = time()
+        time_end = parallel.cpu_time()
         avg_recommendation_time = (time_end - time_start) / len(self.dataset.learners)
 
         print(f"Average Recommendation Time: {avg_recommendation_time:.4f} seconds")
@@ -0,0 +1,303 @@
+import json
+import argparse
+import threading
+
+from collections import deque
+from time import perf_counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import yaml
+import numpy as np
+
+from Dataset import Dataset
+from SkillMatrix import LEVEL_DTYPE
+
+
+class RecommenderService:
+    # The RecommenderService class serves recommendations for single learners on demand, using a dataset and indexes loaded once
+    def __init__(
+        self,
+        dataset,
+        threshold,
+        k,
+        model="greedy",
+        model_path=None,
+        max_latencies=10000,
+        action_masking=False,
+    ):
+        """Create the service
+
+        Args:
+            dataset (Dataset): the loaded dataset
+            threshold (float): the threshold for the matching
+            k (int): default number of courses to recommend
+            model (str, optional): greedy, or dqn, a2c or ppo for an agent trained by Reinforce. Defaults to "greedy".
+            model_path (str, optional): path of the agent saved by Reinforce, required if model is not greedy. Defaults to None.
+            max_latencies (int, optional): number of latest requests used for the latency statistics. Defaults to 10000.
+            action_masking (bool, optional): whether the ppo agent was trained with action masking. Defaults to False.
+        """
+        self.dataset = dataset
+        self.threshold = threshold
+        self.k = k
+        self.model_name = model
+        self.action_masking = action_masking
+        if model != "greedy":
+            self.load_agent(model_path)
+        self.latencies = deque(maxlen=max_latencies)
+        self.lock = threading.Lock()
+
+    def load_agent(self, model_path):
+        """Load a trained agent
+
+        Args:
+            model_path (str): path of the agent saved by Reinforce
+        """
+        from stable_baselines3 import DQN, A2C, PPO
+
+        agent_classes = {"dqn": DQN, "a2c": A2C, "ppo": PPO}
+        if self.action_masking:
+            from Reinforce import get_maskable_ppo
+
+            agent_classes["ppo"] = get_maskable_ppo()
+        self.agent = agent_classes[self.model_name].load(model_path, device="cpu")
+        # the agent is shared by the requests, so its predictions are serialized
+        self.agent_lock = threading.Lock()
+
+    def get_learner(self, cv, replace_unk=1):
+        """Get the skills vector of a resume
+
+        Args:
+            cv (list): list of [skill, mastery level] pairs, as the values of the resumes file
+            replace_unk (int, optional): The value to replace the unknown mastery levels. Defaults to 1.
+
+        Returns:
+            np.array: the mastery level of the learner for each skill
+        """
+        learner = np.zeros(len(self.dataset.skills), dtype=LEVEL_DTYPE)
+        # the skills that are not in the taxonomy are ignored
+        cv = [[skill, level] for skill, level in cv if skill in self.dataset.skills2int]
+        for skill, level in self.dataset.get_avg_skills(cv, replace_unk).items():
+            learner[skill] = level
+        return learner
+
+    def get_greedy_recommendation(self, learner, k):
+        """Make k greedy recommendations for the learner. The enrollable courses are scored in one shot with the batch
+        matching of the dataset, and the course is selected with the same rule as Greedy.get_course_recommendation
+
+        Args:
+            learner (np.array): skills vector of the learner
+            k (int): number of courses to recommend
+
+        Returns:
+            tuple: the ids of the recommended courses in the dataset and the updated learner
+        """
+        recommendation_sequence = []
+        for _ in range(k):
+            enrollable, _ = self.dataset.get_batch_enrollable_courses(
+                [learner], self.threshold
+            )
+            courses_ids = np.flatnonzero(enrollable[0])
+            if len(courses_ids) == 0:
+                break
+            tmp_learners = np.maximum(
+                learner, np.asarray(self.dataset.courses[courses_ids])[:, 1]
+            )
+            all_nb_applicable_jobs = self.dataset.get_batch_nb_applicable_jobs(
+                tmp_learners, self.threshold
+            )
+            all_attractiveness = self.dataset.get_batch_learner_attractiveness(
+                tmp_learners
+            )
+
+            # the first course with the most applicable jobs, then the highest attractiveness
+            max_nb_applicable_jobs = all_nb_applicable_jobs.max()
+            candidates = np.flatnonzero(all_nb_applicable_jobs == max_nb_applicable_jobs)
+            best = candidates[np.argmax(all_attractiveness[candidates])]
+            # stop if no course increases the number of applicable jobs or the attractiveness, as Greedy does
+            if max_nb_applicable_jobs == 0 and all_attractiveness[best] == 0:
+                break
+            recommendation_sequence.append(int(courses_ids[best]))
+            learner = tmp_learners[best]
+        return recommendation_sequence, learner
+
+    def get_agent_recommendation(self, learner, k):
+        """Make the recommendations of the trained agent for the learner, as in Reinforce.reinforce_recommendation
+
+        Args:
+            learner (np.array): skills vector of the learner
+            k (int): number of courses to recommend
+
+        Returns:
+            tuple: the ids of the recommended courses in the dataset and the updated learner
+        """
+        # imported here so that the greedy service does not need stable-baselines3
+        from CourseRecEnv import batch_recommendation
+
+        with self.agent_lock:
+            recommendations, new_learners, _ = batch_recommendation(
+                self.agent, self.dataset, [learner], self.threshold, k
+            )
+        return recommendations[0], new_learners[0]
+
+    def recommend(self, cv, k=None):
+        """Recommend courses to a learner
+
+        Args:
+            cv (list): list of [skill, mastery level] pairs, as the values of the resumes file
+            k (int, optional): number of courses to recommend. Defaults to None (the k of the service).
+
+        Returns:
+            dict: the ids of the recommended courses, the number of applicable jobs and the attractiveness of the learner
+                before and after the courses, and the time taken by the recommendation in seconds
+        """
+        time_start = perf_counter()
+        k = self.k if k is None else k
+        learner = self.get_learner(cv)
+        if self.model_name == "greedy":
+            recommendation_sequence, new_learner = self.get_greedy_recommendation(learner, k)
+        else:
+            recommendation_sequence, new_learner = self.get_agent_recommendation(learner, k)
+
+        # the learner before and after the courses are matched with the jobs at once
+        learners = np.stack([learner, new_learner])
+        nb_applicable_jobs = self.dataset.get_batch_nb_applicable_jobs(
+            learners, self.threshold
+        )
+        attractiveness = self.dataset.get_batch_learner_attractiveness(learners)
+        response = {
+            "recommendations": self.dataset.courses_index.get_ids(
+                recommendation_sequence
+            ),
+            "original_applicable_jobs": int(nb_applicable_jobs[0]),
+            "new_applicable_jobs": int(nb_applicable_jobs[1]),
+            "original_attractiveness": int(attractiveness[0]),
+            "new_attractiveness": int(attractiveness[1]),
+        }
+        latency = perf_counter() - time_start
+        response["latency"] = latency
+        with self.lock:
+            self.latencies.append(latency)
+        return response
+
+    def get_latency_stats(self):
+        """Get the statistics of the latency of the latest requests
+
+        Returns:
+            dict: number of requests, p50, p99 and mean latency in seconds
+        """
+        with self.lock:
+            latencies = np.array(self.latencies)
+        if len(latencies) == 0:
+            return {"nb_requests": 0}
+        return {
+            "nb_requests": len(latencies),
+            "p50": float(np.percentile(latencies, 50)),
+            "p99": float(np.percentile(latencies, 99)),
+            "mean": float(latencies.mean()),
+        }
+
+
+class RecommenderRequestHandler(BaseHTTPRequestHandler):
+    # The RecommenderRequestHandler class handles the HTTP requests of the server created by get_server:
+    #   POST /recommend with a json body {"cv": [[skill, level], ...], "k": 2} or {"id": [[skill, level], ...], ..., "k": 2} as in the resumes file
+    #   GET /stats for the latency statistics
+    service = None
+
+    def send_json(self, status, content):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self.send_json(200, self.service.get_latency_stats())
+        else:
+            self.send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/recommend":
+            self.send_json(404, {"error": f"unknown path {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if not isinstance(request, dict):
+                raise TypeError("the body must be a json object")
+            if "cv" in request:
+                response = self.service.recommend(request["cv"], request.get("k"))
+            else:
+                # k applies to all the resumes of the batch, it is not a learner id
+                request = dict(request)
+                k = request.pop("k", None)
+                response = {
+                    learner_id: self.service.recommend(cv, k)
+                    for learner_id, cv in request.items()
+                }
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        self.send_json(200, response)
+
+    def log_message(self, format, *args):
+        # do not print a line for each request
+        pass
+
+
+def get_server(service, host="127.0.0.1", port=8000):
+    """Create a HTTP server for the service that handles each request in a thread
+
+    Args:
+        service (RecommenderService): the service
+        host (str, optional): host of the server. Defaults to "127.0.0.1".
+        port (int, optional): port of the server, 0 for a free port. Defaults to 8000.
+
+    Returns:
+        ThreadingHTTPServer: the server, started with serve_forever()
+    """
+    handler = type(
+        "ServiceRequestHandler", (RecommenderRequestHandler,), {"service": service}
+    )
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    """Load the dataset and serve the recommendations over HTTP."""
+    parser = argparse.ArgumentParser(description="Serve course recommendations.")
+
+    parser.add_argument(
+        "--config", help="Path to the configuration file", default="config/run.yaml"
+    )
+    parser.add_argument("--host", help="Host of the server", default="127.0.0.1")
+    parser.add_argument("--port", help="Port of the server", type=int, default=8000)
+    parser.add_argument(
+        "--model_path", help="Path of the agent saved by Reinforce", default=None
+    )
+
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+
+    dataset = Dataset(config)
+    print(dataset)
+    model = config["model"] if config["model"] in ["dqn", "a2c", "ppo"] else "greedy"
+    service = RecommenderService(
+        dataset,
+        config["threshold"],
+        config["k"],
+        model,
+        args.model_path,
+        action_masking=config.get("action_masking", False),
+    )
+    server = get_server(service, args.host, args.port)
+    print(f"Serving {model} recommendations on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
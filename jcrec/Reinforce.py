@@ -1,11 +1,36 @@
 import os
 import json
+import multiprocessing as mp
 
 import numpy as np
 from time import process_time
 from stable_baselines3 import DQN, A2C, PPO
+from stable_baselines3.common.env_util import make_vec_env
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
 
-from CourseRecEnv import CourseRecEnv, EvaluateCallback
+import profiler
+from RewardCache import RewardCache
+from CourseRecEnv import (
+    CourseRecEnv,
+    CourseRecVecEnv,
+    EvaluateCallback,
+    batch_recommendation,
+)
+
+
+def get_maskable_ppo():
+    """Get the MaskablePPO class of sb3-contrib, the optional dependency of the action masking
+
+    Returns:
+        type: the MaskablePPO class
+    """
+    try:
+        from sb3_contrib import MaskablePPO
+    except ImportError:
+        raise ImportError(
+            "action_masking requires sb3-contrib, install it with pip install sb3-contrib==2.2.1"
+        )
+    return MaskablePPO
 
 
 class Reinforce:
@@ -19,9 +44,21 @@ class Reinforce:
         self.run = run
         self.total_steps = total_steps
         self.eval_freq = eval_freq
+        # the agent only chooses among the courses that the learner can take if action_masking is true in the config
+        self.action_masking = dataset.config.get("action_masking", False)
+        # the number of applicable jobs of the skill profiles visited by the training and evaluation environments are
+        # memoized in a cache shared by the environments if reward_cache_size > 0 in the config
+        reward_cache_size = dataset.config.get("reward_cache_size", 0)
+        self.reward_cache = (
+            RewardCache(dataset, threshold, reward_cache_size)
+            if reward_cache_size > 0
+            else None
+        )
         # Create the training and evaluation environments
-        self.train_env = CourseRecEnv(dataset, threshold=self.threshold, k=self.k)
-        self.eval_env = CourseRecEnv(dataset, threshold=self.threshold, k=self.k)
+        self.train_env = self.get_train_env()
+        self.eval_env = CourseRecEnv(
+            dataset, threshold=self.threshold, k=self.k, reward_cache=self.reward_cache
+        )
         self.get_model()
         self.all_results_filename = (
             "all_"
@@ -45,21 +82,94 @@ class Reinforce:
             + str(self.run)
             + ".json"
         )
+        self.model_filename = (
+            "model_"
+            + self.model_name
+            + "_nbskills_"
+            + str(len(self.dataset.skills))
+            + "_k_"
+            + str(self.k)
+            + "_run_"
+            + str(self.run)
+            + ".zip"
+        )
 
+        # the callback is called once per step of the vectorized environment, which makes nb_envs steps, so eval_freq is
+        # divided by nb_envs to evaluate the agent every eval_freq steps whatever the number of environments
+        nb_envs = self.dataset.config.get("nb_envs", 1)
         self.eval_callback = EvaluateCallback(
             self.eval_env,
-            eval_freq=self.eval_freq,
+            eval_freq=max(self.eval_freq // nb_envs, 1),
             all_results_filename=self.all_results_filename,
         )
 
+    def get_train_env(self):
+        """Creates the training environment. If nb_envs > 1 in the config, the environment is vectorized: vec_env is native for
+        CourseRecVecEnv that steps all the learners at once with array operations, subproc for one CourseRecEnv per process
+        or dummy for several CourseRecEnv stepped one after the other in the same process. The processes of subproc each
+        have their own copy of the reward cache.
+
+        Returns:
+            gym.Env or VecEnv: the training environment
+        """
+        nb_envs = self.dataset.config.get("nb_envs", 1)
+        vec_env = self.dataset.config.get("vec_env", "native")
+        if vec_env not in ["native", "subproc", "dummy"]:
+            raise ValueError(
+                f"Unknown vec_env {vec_env}, it must be native, subproc or dummy"
+            )
+        if nb_envs == 1:
+            return CourseRecEnv(
+                self.dataset,
+                threshold=self.threshold,
+                k=self.k,
+                reward_cache=self.reward_cache,
+            )
+        if vec_env == "native":
+            return CourseRecVecEnv(
+                self.dataset,
+                threshold=self.threshold,
+                k=self.k,
+                nb_envs=nb_envs,
+                reward_cache=self.reward_cache,
+            )
+
+        def make_env():
+            return CourseRecEnv(
+                self.dataset,
+                threshold=self.threshold,
+                k=self.k,
+                reward_cache=self.reward_cache,
+            )
+
+        if vec_env == "subproc":
+            # with fork the processes inherit the dataset instead of receiving a pickled copy
+            start_method = "fork" if "fork" in mp.get_all_start_methods() else None
+            return make_vec_env(
+                make_env,
+                n_envs=nb_envs,
+                vec_env_cls=SubprocVecEnv,
+                vec_env_kwargs={"start_method": start_method},
+            )
+        return make_vec_env(make_env, n_envs=nb_envs, vec_env_cls=DummyVecEnv)
+
     def get_model(self):
-        """Sets the model to be used for the recommendation. The model is from stable-baselines3 and is chosen based on the model_name attribute."""
+        """Sets the model to be used for the recommendation. The model is from stable-baselines3 and is chosen based on the model_name attribute.
+        With action_masking, ppo is the MaskablePPO of sb3-contrib, the other models do not support the masks."""
+        if self.action_masking and self.model_name != "ppo":
+            raise ValueError(
+                f"action_masking is only supported with ppo, not {self.model_name}"
+            )
         if self.model_name == "dqn":
             self.model = DQN(env=self.train_env, verbose=0, policy="MlpPolicy")
         elif self.model_name == "a2c":
             self.model = A2C(
                 env=self.train_env, verbose=0, policy="MlpPolicy", device="cpu"
             )
+        elif self.model_name == "ppo" and self.action_masking:
+            self.model = get_maskable_ppo()(
+                env=self.train_env, verbose=0, policy="MlpPolicy"
+            )
         elif self.model_name == "ppo":
             self.model = PPO(env=self.train_env, verbose=0, policy="MlpPolicy")
 
@@ -88,31 +198,44 @@ class Reinforce:
         results["original_applicable_jobs"] = avg_app_j
 
         # Train the model
-        self.model.learn(total_timesteps=self.total_steps, callback=self.eval_callback)
+        with profiler.timer("Reinforce.learn"):
+            self.model.learn(
+                total_timesteps=self.total_steps, callback=self.eval_callback
+            )
+        # the trained model can be loaded by the RecommenderService
+        self.model.save(
+            os.path.join(self.dataset.config["results_path"], self.model_filename)
+        )
+
+        if self.reward_cache is not None:
+            stats = self.reward_cache.get_stats()
+            print(
+                f"Reward cache: {stats['hits']} hits, {stats['misses']} misses, hit rate {stats['hit_rate']:.2%}, "
+                f"{stats['size']} profiles"
+            )
+            results["reward_cache_hit_rate"] = stats["hit_rate"]
 
         # Evaluate the model
         time_start = process_time()
+        # all the learners are evaluated at once with batched predictions
+        with profiler.timer("Reinforce.evaluate"):
+            recommendation_sequences, new_learners, _ = batch_recommendation(
+                self.model,
+                self.dataset,
+                self.dataset.learners,
+                self.threshold,
+                self.k,
+                reward_cache=self.reward_cache,
+            )
         recommendations = dict()
-        for i, learner in enumerate(self.dataset.learners):
-            self.eval_env.reset(learner=learner)
-            done = False
+        for i, (recommendation_sequence, learner) in enumerate(
+            zip(recommendation_sequences, new_learners)
+        ):
+            self.dataset.learners[i] = learner
             index = self.dataset.learners_index[i]
-            recommendation_sequence = []
-            while not done:
-                obs = self.eval_env._get_obs()
-                action, _state = self.model.predict(obs, deterministic=True)
-                obs, reward, done, _, info = self.eval_env.step(action)
-                if reward != -1:
-                    recommendation_sequence.append(action.item())
-            for course in recommendation_sequence:
-                self.dataset.learners[i] = self.update_learner_profile(
-                    learner, self.dataset.courses[course]
-                )
-
-            recommendations[index] = [
-                self.dataset.courses_index[course_id]
-                for course_id in recommendation_sequence
-            ]
+            recommendations[index] = self.dataset.courses_index.get_ids(
+                recommendation_sequence
+            )
 
         time_end = process_time()
         avg_recommendation_time = (time_end - time_start) / len(self.dataset.learners)
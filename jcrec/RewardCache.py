@@ -0,0 +1,109 @@
+import hashlib
+
+from collections import OrderedDict
+
+import numpy as np
+
+import profiler
+from SkillMatrix import LEVEL_DTYPE
+
+
+class RewardCache:
+    # The RewardCache class memoizes the number of applicable jobs and the attractiveness of the skill profiles, so that the
+    # environments do not match again with the jobs the profiles that they already visited. The least recently used
+    # profiles are removed when the cache is full.
+    def __init__(self, dataset, threshold, capacity=100000):
+        """Create an empty cache
+
+        Args:
+            dataset (Dataset): the dataset
+            threshold (float): the threshold for the matching
+            capacity (int, optional): maximum number of profiles in the cache. Defaults to 100000.
+        """
+        self.dataset = dataset
+        self.threshold = threshold
+        self.capacity = capacity
+        # key of the profile -> (number of applicable jobs, attractiveness), from the least to the most recently used
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(learner):
+        """Get the key of a skill profile, a 128 bits hash of its levels
+
+        Args:
+            learner (np.array): skills vector of the learner
+
+        Returns:
+            bytes: the key
+        """
+        levels = np.ascontiguousarray(learner, dtype=LEVEL_DTYPE)
+        return hashlib.blake2b(levels.tobytes(), digest_size=16).digest()
+
+    @profiler.profiled
+    def get(self, learners):
+        """Get the number of applicable jobs and the attractiveness of each learner of a matrix of learners. The profiles
+        that are not in the cache are computed at once with the batch functions of the dataset and added to the cache
+
+        Args:
+            learners (np.array): matrix of skills and mastery levels of the learners
+
+        Returns:
+            tuple: the number of applicable jobs and the attractiveness of each learner
+        """
+        learners = np.atleast_2d(np.asarray(learners))
+        keys = [self.get_key(learner) for learner in learners]
+        results = np.zeros((len(learners), 2), dtype=int)
+        missing = []
+        for i, key in enumerate(keys):
+            entry = self.entries.get(key)
+            if entry is None:
+                missing.append(i)
+            else:
+                self.entries.move_to_end(key)
+                results[i] = entry
+        self.hits += len(learners) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            nb_applicable_jobs = self.dataset.get_batch_nb_applicable_jobs(
+                learners[missing], self.threshold
+            )
+            attractiveness = self.dataset.get_batch_learner_attractiveness(
+                learners[missing]
+            )
+            for i, entry in zip(
+                missing, zip(nb_applicable_jobs.tolist(), attractiveness.tolist())
+            ):
+                results[i] = entry
+                self.entries[keys[i]] = entry
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return results[:, 0], results[:, 1]
+
+    def get_nb_applicable_jobs(self, learner):
+        """Get the number of applicable jobs of a learner
+
+        Args:
+            learner (np.array): skills vector of the learner
+
+        Returns:
+            int: the number of applicable jobs
+        """
+        return int(self.get([learner])[0][0])
+
+    def get_stats(self):
+        """Get the statistics of the cache
+
+        Returns:
+            dict: number of hits and misses, hit rate, number of profiles in the cache and capacity
+        """
+        nb_requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / nb_requests if nb_requests > 0 else 0.0,
+            "size": len(self.entries),
+            "capacity": self.capacity,
+        }
@@ -0,0 +1,271 @@
+import numpy as np
+
+# type of the mastery levels of the learners, jobs and courses, in the dense and in the sparse matrices
+LEVEL_DTYPE = np.uint8
+
+
+class SkillMatrix:
+    # The SkillMatrix class stores a matrix of mastery levels (learners, jobs or courses) in compressed sparse row (CSR) format.
+    # Rows are read and written as dense numpy arrays so that it can be used in place of the dense matrices of the Dataset.
+    def __init__(self, indptr, indices, data, shape):
+        """Create a matrix from its CSR arrays
+
+        Args:
+            indptr (np.array): index of the first non zero element of each row in indices and data, of length nb_rows + 1
+            indices (np.array): flat position in the row of each non zero element (sorted within each row)
+            data (np.array): mastery level of each non zero element
+            shape (tuple): shape of the equivalent dense matrix, (nb_rows, nb_skills) or (nb_courses, 2, nb_skills)
+        """
+        self.shape = tuple(shape)
+        self.row_shape = self.shape[1:]
+        self.row_size = int(np.prod(self.row_shape))
+        self._indptr = np.asarray(indptr, dtype=np.int64)
+        self._indices = np.asarray(indices, dtype=np.int32)
+        self._data = np.asarray(data)
+        self.dtype = self._data.dtype
+        # rows written with __setitem__ are kept aside as (indices, data) and merged lazily in the CSR arrays
+        self.updated_rows = dict()
+
+    @classmethod
+    def from_rows(cls, rows, shape, dtype=LEVEL_DTYPE):
+        """Create a matrix from a list of rows given as dictionaries
+
+        Args:
+            rows (list): list of dictionaries that map the flat position of a skill in the row to its mastery level
+            shape (tuple): shape of the equivalent dense matrix
+            dtype (type, optional): type of the mastery levels. Defaults to LEVEL_DTYPE.
+
+        Returns:
+            SkillMatrix: the sparse matrix
+        """
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(row) for row in rows])
+        indices = np.empty(indptr[-1], dtype=np.int32)
+        data = np.empty(indptr[-1], dtype=dtype)
+        for i, row in enumerate(rows):
+            row_indices = sorted(row)
+            indices[indptr[i] : indptr[i + 1]] = row_indices
+            data[indptr[i] : indptr[i + 1]] = [row[index] for index in row_indices]
+        return cls(indptr, indices, data, shape)
+
+    @classmethod
+    def from_dense(cls, array, dtype=LEVEL_DTYPE):
+        """Create a matrix from a dense numpy array
+
+        Args:
+            array (np.array): dense matrix of mastery levels
+            dtype (type, optional): type of the mastery levels. Defaults to LEVEL_DTYPE.
+
+        Returns:
+            SkillMatrix: the sparse matrix
+        """
+        array = np.asarray(array)
+        flat = array.reshape(len(array), -1)
+        rows, indices = np.nonzero(flat)
+        indptr = np.zeros(len(array) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(rows, minlength=len(array)))
+        return cls(indptr, indices, flat[rows, indices].astype(dtype), array.shape)
+
+    @classmethod
+    def concatenate(cls, matrices, row_shape):
+        """Stack the rows of several matrices
+
+        Args:
+            matrices (list): list of SkillMatrix with the same row shape
+            row_shape (tuple): shape of a row, used when the list is empty
+
+        Returns:
+            SkillMatrix: the matrix with the rows of all the matrices
+        """
+        indptr = [np.zeros(1, dtype=np.int64)]
+        offset = 0
+        for matrix in matrices:
+            indptr.append(matrix.indptr[1:] + offset)
+            offset += matrix.nnz
+        return cls(
+            np.concatenate(indptr),
+            np.concatenate([matrix.indices for matrix in matrices] + [np.zeros(0, dtype=np.int32)]),
+            np.concatenate([matrix.data for matrix in matrices] + [np.zeros(0, dtype=LEVEL_DTYPE)]),
+            (sum(len(matrix) for matrix in matrices),) + tuple(row_shape),
+        )
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __str__(self):
+        return f"SkillMatrix of shape {self.shape} with {self.nnz} non zero elements"
+
+    @property
+    def indptr(self):
+        self.compact()
+        return self._indptr
+
+    @property
+    def indices(self):
+        self.compact()
+        return self._indices
+
+    @property
+    def data(self):
+        self.compact()
+        return self._data
+
+    @property
+    def nnz(self):
+        return len(self.indices)
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+
+    def get_row(self, i):
+        """Get the non zero elements of a row
+
+        Args:
+            i (int): index of the row
+
+        Returns:
+            tuple: flat positions and mastery levels of the non zero elements of the row
+        """
+        if i in self.updated_rows:
+            return self.updated_rows[i]
+        start, end = self._indptr[i], self._indptr[i + 1]
+        return self._indices[start:end], self._data[start:end]
+
+    def __getitem__(self, key):
+        """Get a dense row if key is an integer, or a new SkillMatrix with the selected rows if key is a slice or a list of indices"""
+        if not isinstance(key, slice) and np.ndim(key) == 0:
+            # integers, numpy integers and 0-d arrays such as the actions predicted by the agents
+            key = int(key)
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError(f"row index {key} out of range for {len(self)} rows")
+            row = np.zeros(self.row_size, dtype=self.dtype)
+            indices, data = self.get_row(key)
+            row[indices] = data
+            return row.reshape(self.row_shape)
+
+        rows = np.arange(len(self))[key]
+        positions = self.get_positions(self.indptr, rows)
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.diff(self._indptr)[rows])
+        return SkillMatrix(
+            indptr,
+            self._indices[positions],
+            self._data[positions],
+            (len(rows),) + self.row_shape,
+        )
+
+    def __setitem__(self, key, row):
+        """Replace the row key by the dense row"""
+        key = int(key)
+        if key < 0:
+            key += len(self)
+        row = np.asarray(row).reshape(self.row_size)
+        indices = np.flatnonzero(row).astype(np.int32)
+        self.updated_rows[key] = (indices, row[indices].astype(self.dtype))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.toarray()
+        return array if dtype is None else array.astype(dtype)
+
+    def toarray(self):
+        """Get the equivalent dense numpy array
+
+        Returns:
+            np.array: the dense matrix
+        """
+        rows, indices = self.nonzero()
+        array = np.zeros((len(self), self.row_size), dtype=self.dtype)
+        array[rows, indices] = self._data
+        return array.reshape(self.shape)
+
+    def nonzero(self):
+        """Get the indices of the non zero elements, like np.nonzero on a 2D array
+
+        Returns:
+            tuple: row and flat position in the row of each non zero element
+        """
+        rows = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        return rows, self._indices
+
+    def get_part(self, part):
+        """Get one part of the rows of a matrix of shape (nb_rows, nb_parts, nb_skills), e.g. the required (0) or provided (1) skills of the courses
+
+        Args:
+            part (int): index of the part
+
+        Returns:
+            SkillMatrix: matrix of shape (nb_rows, nb_skills) with the selected part of each row
+        """
+        nb_skills = self.shape[-1]
+        rows, indices = self.nonzero()
+        selected = indices // nb_skills == part
+        indptr = np.zeros(len(self) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(rows[selected], minlength=len(self)))
+        return SkillMatrix(
+            indptr,
+            indices[selected] - part * nb_skills,
+            self._data[selected],
+            (len(self), nb_skills),
+        )
+
+    def eliminate_zeros(self):
+        """Remove the explicitly stored zeros from the CSR arrays"""
+        rows, _ = self.nonzero()
+        keep = self._data != 0
+        self._indptr = np.zeros(len(self) + 1, dtype=np.int64)
+        self._indptr[1:] = np.cumsum(np.bincount(rows[keep], minlength=len(self)))
+        self._indices = self._indices[keep]
+        self._data = self._data[keep]
+
+    def compact(self):
+        """Merge the rows written with __setitem__ in the CSR arrays"""
+        if not self.updated_rows:
+            return
+        updated_rows = self.updated_rows
+        self.updated_rows = dict()
+
+        lengths = np.diff(self._indptr)
+        for i, (indices, _) in updated_rows.items():
+            lengths[i] = len(indices)
+        indptr = np.zeros(len(self) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(lengths)
+        indices = np.empty(indptr[-1], dtype=np.int32)
+        data = np.empty(indptr[-1], dtype=self.dtype)
+
+        # copy the rows that were not updated in one go, then the updated ones
+        kept_rows = np.ones(len(self), dtype=bool)
+        kept_rows[list(updated_rows)] = False
+        kept_rows = np.flatnonzero(kept_rows)
+        old_positions = self.get_positions(self._indptr, kept_rows)
+        new_positions = self.get_positions(indptr, kept_rows)
+        indices[new_positions] = self._indices[old_positions]
+        data[new_positions] = self._data[old_positions]
+        for i, (row_indices, row_data) in updated_rows.items():
+            indices[indptr[i] : indptr[i + 1]] = row_indices
+            data[indptr[i] : indptr[i + 1]] = row_data
+
+        self._indptr, self._indices, self._data = indptr, indices, data
+
+    @staticmethod
+    def get_positions(indptr, rows):
+        """Get the positions in the CSR arrays of all the elements of the given rows
+
+        Args:
+            indptr (np.array): index of the first element of each row
+            rows (np.array): indices of the rows
+
+        Returns:
+            np.array: positions of the elements of the rows, concatenated in the order of rows
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        lengths = indptr[rows + 1] - indptr[rows]
+        # offset of each element from the start of its row, added to the start of the row
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return np.repeat(indptr[rows], lengths) + offsets
@@ -0,0 +1,446 @@
+import os
+import sys
+import json
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+
+from time import perf_counter
+from datetime import datetime, timezone
+
+import yaml
+import numpy as np
+
+import matchings
+import pipeline
+import generate_dataset
+from Dataset import Dataset
+from BeamSearch import BeamSearch
+from Greedy import Greedy
+from Optimal import Optimal
+from SkillMatrix import SkillMatrix
+
+
+def get_synthetic_dataset(args):
+    """Create a random dataset with the sizes given in the arguments. It is generated by generate_dataset in a temporary
+    directory and loaded from its files, as a generated dataset given with --config
+
+    Args:
+        args (argparse.Namespace): the arguments of the benchmark
+
+    Returns:
+        Dataset: the dataset
+    """
+    generator_args = generate_dataset.get_parser().parse_args([])
+    generator_args.seed = args.seed
+    generator_args.nb_skills = args.nb_skills
+    generator_args.nb_learners = args.nb_learners
+    generator_args.nb_jobs = args.nb_jobs
+    generator_args.nb_courses = args.nb_courses
+    generator_args.max_learner_skills = args.max_learner_skills
+    generator_args.max_job_skills = args.max_job_skills
+    generator_args.max_required_skills = args.max_course_skills
+    generator_args.max_provided_skills = args.max_course_skills
+    # the skills are not grouped by level_3 so that the dataset has nb_skills skills, and the files are not cached since
+    # they are removed after the loading
+    config = {
+        "seed": args.seed,
+        "level_3": False,
+        "sparse": args.sparse,
+        "nb_workers": 1,
+        "cache_path": None,
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        generator_args.output = directory
+        return Dataset(generate_dataset.generate_dataset(generator_args, config))
+
+
+def time_function(function, nb_calls, repeat):
+    """Time nb_calls calls of a function, repeat times, and keep the fastest repetition
+
+    Args:
+        function (function): function called with the index of the call
+        nb_calls (int): number of calls of a repetition
+        repeat (int): number of repetitions
+
+    Returns:
+        dict: number of calls, total time of the fastest repetition, time per call and calls per second
+    """
+    times = []
+    for _ in range(repeat):
+        time_start = perf_counter()
+        for i in range(nb_calls):
+            function(i)
+        times.append(perf_counter() - time_start)
+    total = min(times)
+    return {
+        "nb_calls": nb_calls,
+        "total_time": total,
+        "time_per_call": total / nb_calls,
+        "calls_per_second": nb_calls / total if total > 0 else float("inf"),
+    }
+
+
+def benchmark_matchings(dataset, args):
+    """Benchmark the matching functions between the learners, the jobs and the courses"""
+    learners = [np.asarray(dataset.learners[i]) for i in range(len(dataset.learners))]
+    jobs = [np.asarray(dataset.jobs[i]) for i in range(len(dataset.jobs))]
+    courses = [np.asarray(dataset.courses[i]) for i in range(len(dataset.courses))]
+    nb_learners, nb_jobs, nb_courses = len(learners), len(jobs), len(courses)
+    dense_learners = np.asarray(dataset.learners[: args.batch_size])
+
+    results = dict()
+    results["matchings.matching"] = time_function(
+        lambda i: matchings.matching(learners[i % nb_learners], jobs[i % nb_jobs]),
+        args.nb_calls,
+        args.repeat,
+    )
+    results["matchings.learner_job_matching"] = time_function(
+        lambda i: matchings.learner_job_matching(learners[i % nb_learners], jobs[i % nb_jobs]),
+        args.nb_calls,
+        args.repeat,
+    )
+    results["matchings.learner_course_required_matching"] = time_function(
+        lambda i: matchings.learner_course_required_matching(
+            learners[i % nb_learners], courses[i % nb_courses]
+        ),
+        args.nb_calls,
+        args.repeat,
+    )
+    results["matchings.learner_course_provided_matching"] = time_function(
+        lambda i: matchings.learner_course_provided_matching(
+            learners[i % nb_learners], courses[i % nb_courses]
+        ),
+        args.nb_calls,
+        args.repeat,
+    )
+    # one call matches a batch of learners with all the jobs
+    results["matchings.batch_matching"] = time_function(
+        lambda i: matchings.batch_matching(dense_learners, dataset.jobs_matching_index),
+        1,
+        args.repeat,
+    )
+    results["matchings.batch_matching"]["nb_pairs"] = len(dense_learners) * nb_jobs
+    return results
+
+
+def benchmark_dataset(dataset, args):
+    """Benchmark the number of applicable jobs and the enrollable courses of a learner"""
+    nb_learners = len(dataset.learners)
+    results = dict()
+    results["Dataset.get_nb_applicable_jobs"] = time_function(
+        lambda i: dataset.get_nb_applicable_jobs(dataset.learners[i % nb_learners], args.threshold),
+        args.nb_calls,
+        args.repeat,
+    )
+    results["Dataset.get_all_enrollable_courses"] = time_function(
+        lambda i: dataset.get_all_enrollable_courses(
+            dataset.learners[i % nb_learners], args.threshold
+        ),
+        args.nb_calls,
+        args.repeat,
+    )
+    results["Dataset.get_learner_attractiveness"] = time_function(
+        lambda i: dataset.get_learner_attractiveness(dataset.learners[i % nb_learners]),
+        args.nb_calls,
+        args.repeat,
+    )
+    return results
+
+
+def copy_learners(dataset):
+    """Get a copy of the profiles of the learners, which the recommenders update in place
+
+    Args:
+        dataset (Dataset): the dataset
+
+    Returns:
+        np.array or SkillMatrix: the copy of the learners
+    """
+    if isinstance(dataset.learners, SkillMatrix):
+        # selecting all the rows gives a new matrix with its own arrays
+        return dataset.learners[:]
+    return np.array(dataset.learners, copy=True)
+
+
+def restore_learners(dataset, learners):
+    """Restore the profiles of the learners from a copy made by copy_learners
+
+    Args:
+        dataset (Dataset): the dataset
+        learners (np.array or SkillMatrix): the copy of the learners
+    """
+    if isinstance(dataset.learners, SkillMatrix):
+        dataset.learners = learners[:]
+    else:
+        dataset.learners[...] = learners
+
+
+def benchmark_recommenders(dataset, args):
+    """Benchmark the recommendation of k courses to one learner with the greedy, beam search and optimal recommenders. The
+    profiles of the learners are restored after each recommender"""
+    original_learners = copy_learners(dataset)
+
+    results = dict()
+    greedy = Greedy(dataset, args.threshold)
+    nb_learners = min(args.nb_recommendations, len(dataset.learners))
+    results["Greedy.recommend_sequence_and_update"] = time_function(
+        lambda i: greedy.recommend_sequence_and_update(i, args.k), nb_learners, 1
+    )
+    restore_learners(dataset, original_learners)
+
+    beam_search = BeamSearch(dataset, args.threshold)
+    results["BeamSearch.recommend_and_update"] = time_function(
+        lambda i: beam_search.recommend_and_update(i, args.k), nb_learners, 1
+    )
+    restore_learners(dataset, original_learners)
+
+    optimal = Optimal(dataset, args.threshold)
+    nb_learners = min(args.nb_optimal_recommendations, len(dataset.learners))
+    results["Optimal.recommend_and_update"] = time_function(
+        lambda i: optimal.recommend_and_update(i, args.k), nb_learners, 1
+    )
+    restore_learners(dataset, original_learners)
+    return results
+
+
+def benchmark_environments(dataset, args):
+    """Benchmark the steps of the environments used to train the agents and the batched evaluation of an agent"""
+    try:
+        from stable_baselines3 import PPO
+
+        from CourseRecEnv import CourseRecEnv, CourseRecVecEnv, batch_recommendation
+    except ImportError as e:
+        print(f"The environments are not benchmarked: {e}")
+        return dict()
+
+    results = dict()
+    rng = np.random.default_rng(args.seed)
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    actions = rng.integers(len(dataset.courses), size=args.nb_calls)
+
+    env = CourseRecEnv(dataset, threshold=args.threshold, k=args.k)
+    env.reset()
+
+    def step(i):
+        _, _, terminated, _, _ = env.step(actions[i])
+        if terminated:
+            env.reset()
+
+    results["CourseRecEnv.step"] = time_function(step, args.nb_calls, args.repeat)
+
+    vec_env = CourseRecVecEnv(dataset, threshold=args.threshold, k=args.k, nb_envs=args.nb_envs)
+    vec_env.reset()
+    vec_actions = rng.integers(len(dataset.courses), size=(args.nb_calls, args.nb_envs))
+    nb_steps = max(1, args.nb_calls // args.nb_envs)
+    results["CourseRecVecEnv.step"] = time_function(
+        lambda i: vec_env.step(vec_actions[i]), nb_steps, args.repeat
+    )
+    # one call of step makes a step in every environment
+    results["CourseRecVecEnv.step"]["calls_per_second"] *= args.nb_envs
+
+    model = PPO("MlpPolicy", env, seed=args.seed, device="cpu")
+    nb_learners = min(args.nb_recommendations, len(dataset.learners))
+    learners = dataset.learners[:nb_learners]
+    results["batch_recommendation"] = time_function(
+        lambda i: batch_recommendation(model, dataset, learners, args.threshold, args.k),
+        1,
+        args.repeat,
+    )
+    results["batch_recommendation"]["nb_learners"] = nb_learners
+    return results
+
+
+# code run in a new interpreter by benchmark_startup, it prints the time to import the pipeline and the recommender of a
+# model, and the maximum resident memory of the interpreter in KB (-1 where the resource module is not available)
+STARTUP_CODE = """
+import sys
+from time import perf_counter
+
+time_start = perf_counter()
+import pipeline
+
+pipeline.get_model_class(sys.argv[1])
+time_end = perf_counter()
+try:
+    import resource
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+except ImportError:
+    max_rss = -1
+print(time_end - time_start, max_rss)
+"""
+
+
+def benchmark_startup(dataset, args):
+    """Benchmark the startup of the pipeline with the recommender of each model, each time in a new interpreter so that no
+    module is already imported"""
+    results = dict()
+    for model in pipeline.MODEL_CLASSES:
+        times = []
+        for _ in range(args.repeat):
+            output = subprocess.run(
+                [sys.executable, "-c", STARTUP_CODE, model],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.split()
+            times.append(float(output[0]))
+            max_rss = int(output[1])
+        total = min(times)
+        results[f"startup.{model}"] = {
+            "nb_calls": 1,
+            "total_time": total,
+            "time_per_call": total,
+            "calls_per_second": 1 / total,
+            "max_rss_mb": max_rss / 1024 if max_rss >= 0 else None,
+        }
+    return results
+
+
+# the benchmarks that can be selected with --benchmarks
+BENCHMARKS = {
+    "matchings": benchmark_matchings,
+    "dataset": benchmark_dataset,
+    "recommenders": benchmark_recommenders,
+    "environments": benchmark_environments,
+    "startup": benchmark_startup,
+}
+
+
+def get_commit():
+    """Get the current git commit, to compare the results across commits
+
+    Returns:
+        str: the hash of the commit, None if it is not available
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results, baseline, tolerance):
+    """Compare the time per call of the benchmarks with a previous run
+
+    Args:
+        results (dict): the results of this run
+        baseline (dict): the results of the previous run
+        tolerance (float): relative slowdown above which a benchmark is a regression
+
+    Returns:
+        list: the names of the benchmarks that are slower than the baseline
+    """
+    regressions = []
+    for name, result in results["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            continue
+        ratio = result["time_per_call"] / baseline["benchmarks"][name]["time_per_call"]
+        is_regression = ratio > 1 + tolerance
+        if is_regression:
+            regressions.append(name)
+        print(f"{name:45s} {ratio:6.2f}x {'REGRESSION' if is_regression else ''}")
+    return regressions
+
+
+def main():
+    """Run the benchmarks and save the results in a json file."""
+    parser = argparse.ArgumentParser(description="Benchmark the recommender system.")
+
+    parser.add_argument(
+        "--config",
+        help="Path to a configuration file, to benchmark its dataset instead of a synthetic one",
+        default=None,
+    )
+    parser.add_argument("--nb_learners", type=int, default=1000)
+    parser.add_argument("--nb_jobs", type=int, default=1000)
+    parser.add_argument("--nb_courses", type=int, default=500)
+    parser.add_argument("--nb_skills", type=int, default=100)
+    parser.add_argument("--max_learner_skills", type=int, default=15)
+    parser.add_argument("--max_job_skills", type=int, default=10)
+    parser.add_argument("--max_course_skills", type=int, default=5)
+    parser.add_argument("--sparse", action="store_true")
+    parser.add_argument("--k", type=int, default=2)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--nb_calls", type=int, default=1000, help="Number of calls of the functions"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Number of repetitions, the fastest is kept"
+    )
+    parser.add_argument(
+        "--batch_size", type=int, default=1024, help="Number of learners of batch_matching"
+    )
+    parser.add_argument(
+        "--nb_recommendations", type=int, default=100, help="Number of learners for greedy and the agent"
+    )
+    parser.add_argument(
+        "--nb_optimal_recommendations", type=int, default=10, help="Number of learners for optimal"
+    )
+    parser.add_argument("--nb_envs", type=int, default=64)
+    parser.add_argument(
+        "--benchmarks", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS)
+    )
+    parser.add_argument(
+        "--output", help="Path of the json results", default="results/benchmark.json"
+    )
+    parser.add_argument(
+        "--compare", help="Path of the json results of a previous run to compare with", default=None
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="Relative slowdown reported as a regression"
+    )
+
+    args = parser.parse_args()
+
+    if args.config is not None:
+        with open(args.config, "r") as f:
+            config = yaml.load(f, Loader=yaml.FullLoader)
+        dataset = Dataset(config)
+        args.k = config["k"]
+        args.threshold = config["threshold"]
+    else:
+        dataset = get_synthetic_dataset(args)
+    print(dataset)
+
+    results = {
+        "commit": get_commit(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "parameters": vars(args),
+        "dataset": {
+            "nb_learners": len(dataset.learners),
+            "nb_jobs": len(dataset.jobs),
+            "nb_courses": len(dataset.courses),
+            "nb_skills": len(dataset.skills),
+        },
+        "benchmarks": dict(),
+    }
+    for name in args.benchmarks:
+        results["benchmarks"].update(BENCHMARKS[name](dataset, args))
+
+    for name, result in results["benchmarks"].items():
+        print(
+            f"{name:45s} {result['time_per_call'] * 1e6:12.1f} us/call {result['calls_per_second']:12.1f} calls/s"
+        )
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=4)
+
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        if compare_results(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+import os
+import json
+import argparse
+import itertools
+import traceback
+import multiprocessing
+
+from time import perf_counter
+
+import yaml
+import pandas as pd
+
+import pipeline
+import profiler
+from Dataset import Dataset
+
+# name of the file written in the results directory of a configuration when it is done
+EXPERIMENT_FILENAME = "experiment.json"
+
+
+def get_experiments(config, grid):
+    """Get the configurations of the grid. Each combination of the values of the grid is run nb_runs times, and the seed of
+    the run r is seed * nb_runs + r so that each run has its own subsample of the learners, jobs and courses, also when the
+    grid has several seeds (with seed + r, the run 1 of the seed 1 would be the run 0 of the seed 2)
+
+    Args:
+        config (dict): the base config, the keys of the grid replace its values
+        grid (dict): the list of values of each key of the config, e.g. {"model": ["greedy", "optimal"], "k": [1, 2, 3]}
+
+    Returns:
+        list: the experiments as dictionaries with the name, the parameters, the run and the config of each configuration
+    """
+    experiments = []
+    for values in itertools.product(*grid.values()):
+        parameters = dict(zip(grid.keys(), values))
+        for run in range(config["nb_runs"]):
+            name = "_".join(f"{key}_{value}" for key, value in parameters.items())
+            name = f"{name}_run_{run}" if name else f"run_{run}"
+            experiment_config = dict(config)
+            experiment_config.update(parameters)
+            experiment_config["seed"] = experiment_config["seed"] * config["nb_runs"] + run
+            # the results of each configuration are saved in their own directory
+            experiment_config["results_path"] = os.path.join(config["results_path"], name)
+            # the configurations already run in parallel, so they do not start processes of their own
+            experiment_config["nb_workers"] = 1
+            if experiment_config.get("vec_env") == "subproc":
+                experiment_config["vec_env"] = "native"
+            experiments.append(
+                {
+                    "name": name,
+                    "parameters": parameters,
+                    "run": run,
+                    "config": experiment_config,
+                }
+            )
+    return experiments
+
+
+def is_done(experiment):
+    """Check whether a configuration was already run
+
+    Args:
+        experiment (dict): the experiment returned by get_experiments
+
+    Returns:
+        bool: whether its results are in its results directory
+    """
+    return os.path.exists(
+        os.path.join(experiment["config"]["results_path"], EXPERIMENT_FILENAME)
+    )
+
+
+def get_dataset_key(config):
+    """Get the files and parameters of the config that the dataset depends on, the configurations with the same key
+    share the same compiled dataset in the cache
+
+    Args:
+        config (dict): the config
+
+    Returns:
+        tuple: the key of the dataset
+    """
+    return tuple(
+        config.get(key) for key in Dataset.cache_files + Dataset.cache_parameters
+    )
+
+
+def compile_dataset(config):
+    """Load a dataset to save it in the cache, so that the configurations that use it only load the compiled dataset
+
+    Args:
+        config (dict): the config
+
+    Returns:
+        str: the description of the dataset
+    """
+    return str(Dataset(config))
+
+
+def get_results(results_path):
+    """Get the results saved by the model of a configuration, without the recommendations
+
+    Args:
+        results_path (str): the results directory of the configuration
+
+    Returns:
+        dict: the attractiveness, number of applicable jobs and recommendation time before and after the recommendations
+    """
+    results = dict()
+    for filename in sorted(os.listdir(results_path)):
+        if not filename.endswith(".json") or filename.startswith("profile_"):
+            continue
+        with open(os.path.join(results_path, filename)) as f:
+            content = json.load(f)
+        if isinstance(content, dict) and "new_applicable_jobs" in content:
+            results.update(
+                {key: value for key, value in content.items() if key != "recommendations"}
+            )
+    return results
+
+
+def run_experiment(experiment):
+    """Run a configuration and save its parameters and results in the file EXPERIMENT_FILENAME of its results directory
+
+    Args:
+        experiment (dict): the experiment returned by get_experiments
+
+    Returns:
+        dict: the experiment with its results and its time in seconds, or the error if it failed
+    """
+    config = experiment["config"]
+    os.makedirs(config["results_path"], exist_ok=True)
+    profiler.enable(config.get("profile", False))
+    time_start = perf_counter()
+    try:
+        pipeline.run_and_profile(config, experiment["run"])
+    except Exception:
+        # the other configurations are still run, and this one is run again by the next call of the scheduler
+        return dict(experiment, error=traceback.format_exc())
+    experiment = dict(
+        experiment,
+        results=get_results(config["results_path"]),
+        time=perf_counter() - time_start,
+    )
+    with open(os.path.join(config["results_path"], EXPERIMENT_FILENAME), "w") as f:
+        json.dump(experiment, f, indent=4)
+    return experiment
+
+
+def get_summary(experiments):
+    """Collect the results of the configurations that are done in a table
+
+    Args:
+        experiments (list): the experiments returned by get_experiments
+
+    Returns:
+        pd.DataFrame: one row per configuration with its parameters, its run, its seed, its results and its time
+    """
+    rows = []
+    for experiment in experiments:
+        if not is_done(experiment):
+            continue
+        with open(
+            os.path.join(experiment["config"]["results_path"], EXPERIMENT_FILENAME)
+        ) as f:
+            experiment = json.load(f)
+        rows.append(
+            {
+                "name": experiment["name"],
+                **experiment["parameters"],
+                "run": experiment["run"],
+                "seed": experiment["config"]["seed"],
+                **experiment["results"],
+                "time": experiment["time"],
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def run_experiments(experiments, nb_workers=1):
+    """Run the configurations that are not done yet, in a pool of nb_workers processes if nb_workers > 1. The datasets are
+    first compiled in the cache (once for each dataset key), so the configurations that share a dataset only load it
+
+    Args:
+        experiments (list): the experiments returned by get_experiments
+        nb_workers (int, optional): number of configurations run at once. Defaults to 1.
+
+    Returns:
+        list: the configurations that failed, with their error
+    """
+    todo = [experiment for experiment in experiments if not is_done(experiment)]
+    print(f"{len(experiments) - len(todo)} configurations already done, {len(todo)} to run")
+
+    datasets = dict()
+    for experiment in todo:
+        datasets.setdefault(get_dataset_key(experiment["config"]), experiment["config"])
+    if todo and todo[0]["config"].get("cache_path") is None:
+        # without the cache, each configuration loads its dataset from the files
+        datasets = dict()
+
+    # the recommenders of the models of the grid are imported once here, the forked processes inherit them
+    for experiment in todo:
+        pipeline.get_model_class(experiment["config"]["model"])
+
+    if nb_workers <= 1:
+        for dataset_config in datasets.values():
+            print(compile_dataset(dataset_config))
+        return report_progress(map(run_experiment, todo), len(todo))
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
+    # one task per process, so that the memory of a configuration is released when it is done
+    with context.Pool(nb_workers, maxtasksperchild=1) as pool:
+        for description in pool.imap_unordered(compile_dataset, datasets.values()):
+            print(description)
+        failed = report_progress(pool.imap_unordered(run_experiment, todo), len(todo))
+        pool.close()
+        pool.join()
+    return failed
+
+
+def report_progress(results, nb_experiments):
+    """Print the configurations as they are done
+
+    Args:
+        results (iterable): the experiments returned by run_experiment
+        nb_experiments (int): number of configurations
+
+    Returns:
+        list: the configurations that failed, with their error
+    """
+    failed = []
+    for i, experiment in enumerate(results):
+        if "error" in experiment:
+            failed.append(experiment)
+            print(f"[{i + 1}/{nb_experiments}] {experiment['name']} failed:\n{experiment['error']}")
+        else:
+            print(f"[{i + 1}/{nb_experiments}] {experiment['name']} done in {experiment['time']:.1f} seconds")
+    return failed
+
+
+def main():
+    """Run a grid of configurations of the pipeline in parallel and save the summary of their results."""
+    parser = argparse.ArgumentParser(description="Run a grid of experiments.")
+
+    parser.add_argument(
+        "--grid", help="Path to the file of the grid", default="config/experiments.yaml"
+    )
+    parser.add_argument(
+        "--nb_workers",
+        help="Number of configurations run at once, overrides the grid file",
+        type=int,
+        default=None,
+    )
+
+    args = parser.parse_args()
+
+    with open(args.grid, "r") as f:
+        grid_config = yaml.load(f, Loader=yaml.FullLoader)
+    with open(grid_config["config"], "r") as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+
+    experiments = get_experiments(config, grid_config.get("grid") or dict())
+    nb_workers = args.nb_workers or grid_config.get("nb_workers", 1)
+    failed = run_experiments(experiments, nb_workers)
+
+    summary = get_summary(experiments)
+    os.makedirs(config["results_path"], exist_ok=True)
+    summary_path = os.path.join(config["results_path"], "summary.csv")
+    summary.to_csv(summary_path, index=False)
+    if len(summary) > 0:
+        print(summary.drop(columns="name").to_string(index=False))
+    print(f"Summary of {len(summary)} configurations saved in {summary_path}")
+    if failed:
+        print(f"{len(failed)} configurations failed: {', '.join(e['name'] for e in failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+import os
+import json
+import argparse
+
+import yaml
+import numpy as np
+import pandas as pd
+
+# names of the mastery levels, in the order of the probabilities given in the arguments
+LEVEL_NAMES = ["beginner", "intermediate", "expert", "unknown"]
+MASTERY_LEVELS = {"beginner": 1, "intermediate": 2, "expert": 3, "unknown": -1}
+
+
+def get_nb_skills(rng, nb_rows, min_skills, max_skills, distribution):
+    """Draw the number of skills of each row
+
+    Args:
+        rng (np.random.Generator): random generator
+        nb_rows (int): number of rows
+        min_skills (int): minimum number of skills of a row
+        max_skills (int): maximum number of skills of a row
+        distribution (str): uniform between min_skills and max_skills, or poisson with mean (min_skills + max_skills) / 2
+            clipped to [min_skills, max_skills]
+
+    Returns:
+        np.array: the number of skills of each row
+    """
+    if distribution == "poisson":
+        nb_skills = rng.poisson((min_skills + max_skills) / 2, size=nb_rows)
+        return np.clip(nb_skills, min_skills, max_skills)
+    return rng.integers(min_skills, max_skills + 1, size=nb_rows)
+
+
+def get_rows(rng, nb_rows, skill_probabilities, nb_skills, level_probabilities):
+    """Draw the skills and mastery levels of rows. The skills of all the rows are drawn at once, so a row can have the same
+    skill several times, as in the real data where the levels of a repeated skill are averaged by the Dataset
+
+    Args:
+        rng (np.random.Generator): random generator
+        nb_rows (int): number of rows
+        skill_probabilities (np.array): probability of each skill
+        nb_skills (np.array): number of skills of each row
+        level_probabilities (list): probability of each mastery level of LEVEL_NAMES
+
+    Returns:
+        tuple: the indptr of the rows, the skills and the mastery levels (indices in LEVEL_NAMES) of all the rows
+    """
+    indptr = np.zeros(nb_rows + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(nb_skills)
+    skills = rng.choice(len(skill_probabilities), size=indptr[-1], p=skill_probabilities)
+    levels = rng.choice(len(LEVEL_NAMES), size=indptr[-1], p=level_probabilities)
+    return indptr, skills, levels
+
+
+def get_records(indptr, skills, levels, skill_ids):
+    """Convert rows into records in the format of the resumes and jobs files
+
+    Args:
+        indptr (np.array): index of the first skill of each row
+        skills (np.array): the skills of all the rows
+        levels (np.array): the mastery levels of all the rows
+        skill_ids (np.array): the unique_id of each skill in the taxonomy
+
+    Yields:
+        list: the list of [skill, mastery level] of each row
+    """
+    skills = skill_ids[skills].tolist()
+    levels = levels.tolist()
+    for start, end in zip(indptr[:-1].tolist(), indptr[1:].tolist()):
+        yield [[skills[i], LEVEL_NAMES[levels[i]]] for i in range(start, end)]
+
+
+def write_records(path, records):
+    """Write (id, record) pairs in a json file with one dictionary, or in a jsonl file with one {id: record} per line,
+    one record at a time
+
+    Args:
+        path (str): path of the file, the format is given by its extension
+        records (iterable): the (id, record) pairs
+    """
+    with open(path, "w") as f:
+        if path.endswith(".jsonl"):
+            for record_id, record in records:
+                f.write(json.dumps({record_id: record}) + "\n")
+            return
+
+        f.write("{\n")
+        for i, (record_id, record) in enumerate(records):
+            if i > 0:
+                f.write(",\n")
+            f.write(f"{json.dumps(record_id)}: {json.dumps(record)}")
+        f.write("\n}\n")
+
+
+def get_taxonomy(rng, nb_skills, nb_groups):
+    """Create a taxonomy with the columns of the taxonomy file. Each skill belongs to one of nb_groups skill groups of the
+    third level of the taxonomy, used when level_3 is true
+
+    Args:
+        rng (np.random.Generator): random generator
+        nb_skills (int): number of skills
+        nb_groups (int): number of skill groups of the third level
+
+    Returns:
+        pd.DataFrame: the taxonomy
+    """
+    skill_ids = np.arange(1000, 1000 + nb_skills)
+    groups = rng.integers(nb_groups, size=nb_skills)
+    names = [f"skill {skill_id}" for skill_id in skill_ids]
+    return pd.DataFrame(
+        {
+            "Source": [f"synthetic/skill/{skill_id}" for skill_id in skill_ids],
+            "Type Level 4": names,
+            "altLabels": names,
+            "Definition": [f"Definition of {name}." for name in names],
+            "Dimension": "knowledge",
+            "Type Level 1": [f"group {group // 100}" for group in groups],
+            "Type Level 2": [f"group {group // 10}" for group in groups],
+            "Type Level 3": [f"group {group}" for group in groups],
+            "unique_id": skill_ids,
+            "name": names,
+            "name+definition": [f"{name} : definition of {name}." for name in names],
+        }
+    )
+
+
+def get_skill_probabilities(nb_skills, popularity):
+    """Get the probability of each skill, proportional to 1 / rank ** popularity (0 for skills with the same probability)
+
+    Args:
+        nb_skills (int): number of skills
+        popularity (float): exponent of the Zipf law of the popularity of the skills
+
+    Returns:
+        np.array: the probability of each skill
+    """
+    weights = 1 / np.arange(1, nb_skills + 1) ** popularity
+    return weights / weights.sum()
+
+
+def generate_courses(rng, args, skill_probabilities, skill_ids):
+    """Draw the courses. Each provided skill is also required by the course with probability overlap, the Dataset then
+    lowers its required level below the provided level
+
+    Args:
+        rng (np.random.Generator): random generator
+        args (argparse.Namespace): the arguments of the generator
+        skill_probabilities (np.array): probability of each skill
+        skill_ids (np.array): the unique_id of each skill in the taxonomy
+
+    Yields:
+        tuple: the id and the record of each course
+    """
+    nb_required = get_nb_skills(
+        rng, args.nb_courses, args.min_required_skills, args.max_required_skills, args.distribution
+    )
+    nb_provided = get_nb_skills(
+        rng, args.nb_courses, args.min_provided_skills, args.max_provided_skills, args.distribution
+    )
+    required = get_rows(rng, args.nb_courses, skill_probabilities, nb_required, args.course_levels)
+    provided = get_rows(rng, args.nb_courses, skill_probabilities, nb_provided, args.course_levels)
+    overlap = rng.random(len(provided[1])) < args.overlap
+    overlap_levels = rng.choice(len(LEVEL_NAMES), size=len(provided[1]), p=args.course_levels)
+
+    provided_records = get_records(*provided, skill_ids)
+    for i, (required_record, provided_record) in enumerate(
+        zip(get_records(*required, skill_ids), provided_records)
+    ):
+        start, end = provided[0][i], provided[0][i + 1]
+        required_record += [
+            [int(skill_ids[skill]), LEVEL_NAMES[level]]
+            for skill, level, is_overlap in zip(
+                provided[1][start:end], overlap_levels[start:end], overlap[start:end]
+            )
+            if is_overlap
+        ]
+        course = {"to_acquire": provided_record}
+        if required_record:
+            course["required"] = required_record
+        yield str(i), course
+
+
+def enumerate_ids(records):
+    """Give the ids 0, 1, ... as strings to the records
+
+    Args:
+        records (iterable): the records
+
+    Yields:
+        tuple: the id and the record
+    """
+    for i, record in enumerate(records):
+        yield str(i), record
+
+
+def get_parser():
+    """Get the parser of the arguments of the generator, also used by the benchmarks to generate their dataset
+
+    Returns:
+        argparse.ArgumentParser: the parser
+    """
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset.")
+
+    parser.add_argument("--output", help="Directory of the generated files", default="data/synthetic")
+    parser.add_argument(
+        "--config",
+        help="Configuration file used as a template for the config of the generated dataset",
+        default="config/run.yaml",
+    )
+    parser.add_argument("--format", choices=["json", "jsonl"], default="json")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--nb_skills", type=int, default=1000)
+    parser.add_argument(
+        "--nb_groups", type=int, default=50, help="Number of skill groups of the third level of the taxonomy"
+    )
+    parser.add_argument("--nb_learners", type=int, default=10000)
+    parser.add_argument("--nb_jobs", type=int, default=10000)
+    parser.add_argument("--nb_courses", type=int, default=1000)
+    parser.add_argument("--min_learner_skills", type=int, default=1)
+    parser.add_argument("--max_learner_skills", type=int, default=15)
+    parser.add_argument("--min_job_skills", type=int, default=1)
+    parser.add_argument("--max_job_skills", type=int, default=10)
+    parser.add_argument("--min_required_skills", type=int, default=0)
+    parser.add_argument("--max_required_skills", type=int, default=5)
+    parser.add_argument("--min_provided_skills", type=int, default=1)
+    parser.add_argument("--max_provided_skills", type=int, default=5)
+    parser.add_argument(
+        "--distribution",
+        choices=["uniform", "poisson"],
+        default="uniform",
+        help="Distribution of the number of skills of the learners, jobs and courses between their min and max",
+    )
+    parser.add_argument(
+        "--popularity",
+        type=float,
+        default=1.0,
+        help="Exponent of the Zipf law of the popularity of the skills, 0 for skills with the same probability",
+    )
+    for name, default in [
+        ("learner", [0.3, 0.3, 0.3, 0.1]),
+        ("job", [0.3, 0.3, 0.2, 0.2]),
+        ("course", [0.4, 0.3, 0.2, 0.1]),
+    ]:
+        parser.add_argument(
+            f"--{name}_levels",
+            type=float,
+            nargs=4,
+            default=default,
+            help=f"Probabilities of the mastery levels {', '.join(LEVEL_NAMES)} of the {name}s",
+        )
+    parser.add_argument(
+        "--overlap",
+        type=float,
+        default=0.1,
+        help="Probability that a skill provided by a course is also required by the course",
+    )
+    return parser
+
+
+def generate_dataset(args, config):
+    """Generate a synthetic dataset in the formats of the files read by the Dataset, and a config to use it
+
+    Args:
+        args (argparse.Namespace): the arguments of the generator, see get_parser
+        config (dict): the config used as a template for the config of the generated dataset
+
+    Returns:
+        dict: the config of the generated dataset, also saved as run.yaml in the output directory
+    """
+    for name in ["learner_levels", "job_levels", "course_levels"]:
+        probabilities = np.array(getattr(args, name))
+        setattr(args, name, probabilities / probabilities.sum())
+
+    rng = np.random.default_rng(args.seed)
+    os.makedirs(args.output, exist_ok=True)
+
+    taxonomy = get_taxonomy(rng, args.nb_skills, args.nb_groups)
+    taxonomy.to_csv(os.path.join(args.output, "taxonomy.csv"), index=False)
+    skill_ids = taxonomy["unique_id"].to_numpy()
+    # the skills are popular in a random order
+    skill_probabilities = rng.permutation(get_skill_probabilities(args.nb_skills, args.popularity))
+
+    with open(os.path.join(args.output, "mastery_levels.json"), "w") as f:
+        json.dump(MASTERY_LEVELS, f, indent=4)
+
+    paths = dict()
+    for name, path_key, nb_rows, min_skills, max_skills, levels in [
+        (
+            "resumes",
+            "cv_path",
+            args.nb_learners,
+            args.min_learner_skills,
+            args.max_learner_skills,
+            args.learner_levels,
+        ),
+        ("jobs", "job_path", args.nb_jobs, args.min_job_skills, args.max_job_skills, args.job_levels),
+    ]:
+        nb_skills = get_nb_skills(rng, nb_rows, min_skills, max_skills, args.distribution)
+        rows = get_rows(rng, nb_rows, skill_probabilities, nb_skills, levels)
+        paths[path_key] = os.path.join(args.output, f"{name}.{args.format}")
+        write_records(paths[path_key], enumerate_ids(get_records(*rows, skill_ids)))
+
+    paths["course_path"] = os.path.join(args.output, f"courses.{args.format}")
+    write_records(paths["course_path"], generate_courses(rng, args, skill_probabilities, skill_ids))
+
+    # config of the generated dataset, with all its learners, jobs and courses
+    config = dict(config)
+    config.update(paths)
+    config["taxonomy_path"] = os.path.join(args.output, "taxonomy.csv")
+    config["mastery_levels_path"] = os.path.join(args.output, "mastery_levels.json")
+    config["nb_cvs"] = -1
+    config["nb_jobs"] = -1
+    config["nb_courses"] = -1
+    config["max_cv_skills"] = args.max_learner_skills
+    with open(os.path.join(args.output, "run.yaml"), "w") as f:
+        yaml.dump(config, f, sort_keys=False)
+    return config
+
+
+def main():
+    """Generate a synthetic dataset in the formats of the files read by the Dataset, and a config to use it."""
+    args = get_parser().parse_args()
+    with open(args.config, "r") as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+    generate_dataset(args, config)
+
+    print(
+        f"Generated {args.nb_learners} resumes, {args.nb_jobs} jobs, {args.nb_courses} courses and "
+        f"{args.nb_skills} skills in {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,17 @@
 import numpy as np
 
+import profiler
+from SkillMatrix import SkillMatrix
 
+# maximum number of (learner, target) pairs accumulated in a dense array by overlap_matching_sums
+DENSE_ACCUMULATOR_SIZE = 1 << 20
+# np.sum adds the elements of an array in blocks of at most PAIRWISE_BLOCK_SIZE elements with PAIRWISE_UNROLL partial sums,
+# pairwise_sums adds the elements of the matchings in the same order so that they are the same as with matching
+PAIRWISE_BLOCK_SIZE = 128
+PAIRWISE_UNROLL = 8
+
+
+@profiler.profiled
 def matching(level1, level2):
 
     # get the minimum of the two arrays
@@ -52,3 +63,524 @@ def learner_course_matching(learner, course):
     provided_matching = learner_course_provided_matching(learner, course)
 
     return required_matching * (1 - provided_matching)
+
+
+@profiler.profiled
+def get_matching_index(targets):
+    """Precompute the nonzero structure of a matrix of targets (jobs, required or provided skills of courses) used by the batch
+    matchings
+
+    Args:
+        targets (np.array or SkillMatrix): matrix of shape (nb_targets, nb_skills) with the mastery levels of each target
+
+    Returns:
+        dict: the rows (and the index of the first element of each row), skills and levels of the nonzero elements, the weights that turn each level ratio into an integer and the number of nonzero skills per target
+    """
+    rows, skills = targets.nonzero()
+    levels = targets.data if isinstance(targets, SkillMatrix) else targets[rows, skills]
+
+    # scale is a common multiple of all the levels so that scale * min(l, v) / v is an integer for every level v,
+    # this way the sums are exact and do not depend on the order of the additions, which lets overlap_matching_sums and
+    # JobMatchState add them in any order and update them incrementally (the common multiple is computed on
+    # int64 since it can overflow the type of the levels)
+    scale = int(np.lcm.reduce(np.unique(levels).astype(np.int64))) if len(levels) > 0 else 1
+    # the weights scale / v and the scaled ratios are integers, they are exact in float32 below 2 ** 24, which halves the
+    # memory read by the matchings; the sums and the final division are still computed in float64
+    weights_dtype = np.float32 if scale < 1 << 24 else np.float64
+
+    indptr = np.zeros(len(targets) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(rows, minlength=len(targets)))
+
+    return {
+        "nb_targets": len(targets),
+        "indptr": indptr,
+        "rows": rows,
+        "skills": skills,
+        "levels": levels,
+        "weights": (scale // levels.astype(np.int64)).astype(weights_dtype),
+        "scale": scale,
+        "counts": np.bincount(rows, minlength=len(targets)),
+    }
+
+
+@profiler.profiled
+def batch_matching_sums(learners, index):
+    """Compute the scaled sums of the level ratios min(learner, target) / target of every learner of a block with every target
+
+    Args:
+        learners (np.array): matrix of shape (nb_learners, nb_skills) with the mastery levels of each learner
+        index (dict): nonzero structure of the targets computed by get_matching_index
+
+    Returns:
+        np.array: matrix of shape (nb_learners, nb_targets) with the sums, scaled by index["scale"] so that they are integers
+    """
+    learners = np.atleast_2d(learners)
+    nb_learners = len(learners)
+    nb_targets = index["nb_targets"]
+
+    # get the minimum between the learners and the targets levels on the non zero elements of the targets only
+    minimum_skill = np.minimum(learners[:, index["skills"]], index["levels"])
+
+    # sum the scaled ratios of each target for each learner
+    bins = np.arange(nb_learners)[:, None] * nb_targets + index["rows"]
+    sums = np.bincount(
+        bins.ravel(),
+        weights=(minimum_skill * index["weights"]).ravel(),
+        minlength=nb_learners * nb_targets,
+    ).reshape(nb_learners, nb_targets)
+
+    return sums
+
+
+def get_matching_from_sums(sums, scale, counts):
+    """Turn the scaled sums of batch_matching_sums into matchings
+
+    Args:
+        sums (np.array): scaled sums of the level ratios, the last axis is the targets
+        scale (int): scale of the sums
+        counts (np.array): number of non zero skills of each target
+
+    Returns:
+        np.array: the matchings, with the same shape as sums
+    """
+    # divide by the number of non zero skill levels of each target, targets without skills have a matching of 0
+    matching = np.zeros(sums.shape)
+    nonempty = counts > 0
+    matching[..., nonempty] = sums[..., nonempty] / (scale * counts[nonempty])
+
+    return matching
+
+
+def get_matching_margin(counts):
+    """Get a bound of the difference between the matchings computed from the scaled sums and the matchings of matching
+
+    The scaled sums are exact, while matching rounds each level ratio, each addition and the final division, so the two
+    matchings of a pair differ by a few units in the last place, at most one for each skill of the target plus a few for
+    the divisions (the matchings are at most 1)
+
+    Args:
+        counts (np.array): number of non zero skills of each target
+
+    Returns:
+        np.array: the margin of each target
+    """
+    return (counts + 4) * np.finfo(np.float64).eps
+
+
+def is_applicable(learners, learner_rows, targets, sums, index, threshold):
+    """Decide if the matchings of pairs of a learner and a target reach a threshold, from the scaled sums of the pairs
+
+    The decisions are the ones of matching: the matchings computed from the scaled sums are only used when they are far
+    enough from the threshold, the few pairs within get_matching_margin of the threshold are matched again with the
+    arithmetic of matching
+
+    Args:
+        learners (np.array): matrix of shape (nb_learners, nb_skills) with the mastery levels of each learner
+        learner_rows (np.array): the learner of each pair
+        targets (np.array): the target of each pair
+        sums (np.array): the scaled sum of each pair, see batch_matching_sums
+        index (dict): nonzero structure of the targets computed by get_matching_index
+        threshold (float): the threshold
+
+    Returns:
+        np.array: whether the matching of each pair reaches the threshold
+    """
+    counts = index["counts"][targets]
+    matching = get_matching_from_sums(sums, index["scale"], counts)
+    applicable = matching >= threshold
+    close = np.flatnonzero(np.abs(matching - threshold) <= get_matching_margin(counts))
+    if len(close) > 0:
+        profiler.count("matchings.close_pairs", len(close))
+        learners = np.atleast_2d(learners)
+        applicable[close] = (
+            pairwise_matching(
+                learners[learner_rows[close]], select_matching_index(index, targets[close])
+            )
+            >= threshold
+        )
+
+    return applicable
+
+
+def get_pairwise_plan(lengths):
+    """Precompute the order in which np.sum adds the elements of consecutive segments of an array, for pairwise_sums
+
+    np.sum adds the elements of a segment one after the other if it has less than PAIRWISE_UNROLL elements. Up to
+    PAIRWISE_BLOCK_SIZE elements, it adds every PAIRWISE_UNROLL-th element in PAIRWISE_UNROLL partial sums (lanes), adds
+    the lanes pairwise and then the last elements one after the other. Longer segments are split in two halves (the
+    first one has a multiple of PAIRWISE_UNROLL elements) that are summed recursively
+
+    Args:
+        lengths (np.array): number of elements of each segment
+
+    Returns:
+        dict: the elements added one after the other, the elements of the lanes, the last elements and the plan of the
+            halves of the long segments
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    nb_segments = len(lengths)
+    segments = np.repeat(np.arange(nb_segments), lengths)
+    offsets = np.arange(len(segments)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    element_lengths = lengths[segments]
+    unrolled = element_lengths - element_lengths % PAIRWISE_UNROLL
+
+    short = np.flatnonzero(element_lengths < PAIRWISE_UNROLL)
+    blocked = (element_lengths >= PAIRWISE_UNROLL) & (element_lengths <= PAIRWISE_BLOCK_SIZE)
+    blocked_segments = np.flatnonzero((lengths >= PAIRWISE_UNROLL) & (lengths <= PAIRWISE_BLOCK_SIZE))
+    blocked_ids = np.zeros(nb_segments, dtype=np.int64)
+    blocked_ids[blocked_segments] = np.arange(len(blocked_segments))
+    lanes = np.flatnonzero(blocked & (offsets < unrolled))
+    tails = np.flatnonzero(blocked & (offsets >= unrolled))
+    steps = (offsets - unrolled)[tails]
+
+    long_segments = np.flatnonzero(lengths > PAIRWISE_BLOCK_SIZE)
+    halves = None
+    if len(long_segments) > 0:
+        half_lengths = lengths[long_segments] // 2
+        half_lengths -= half_lengths % PAIRWISE_UNROLL
+        halves = get_pairwise_plan(
+            np.stack([half_lengths, lengths[long_segments] - half_lengths], axis=1).ravel()
+        )
+
+    return {
+        "nb_segments": nb_segments,
+        "short": short,
+        "short_segments": segments[short],
+        "blocked_segments": blocked_segments,
+        "lanes": lanes,
+        "lane_bins": blocked_ids[segments[lanes]] * PAIRWISE_UNROLL + offsets[lanes] % PAIRWISE_UNROLL,
+        "tails": [
+            (tails[steps == step], segments[tails[steps == step]])
+            for step in range(PAIRWISE_UNROLL - 1)
+        ],
+        "long_segments": long_segments,
+        "long": np.flatnonzero(element_lengths > PAIRWISE_BLOCK_SIZE),
+        "halves": halves,
+    }
+
+
+def pairwise_sums(values, plan):
+    """Sum the consecutive segments of the rows of a matrix, adding the elements in the order of np.sum so that each sum
+    is the same as np.sum of the segment
+
+    Args:
+        values (np.array): matrix of shape (nb_rows, nb_elements) with the elements to sum
+        plan (dict): the segments of the elements computed by get_pairwise_plan
+
+    Returns:
+        np.array: matrix of shape (nb_rows, nb_segments) with the sum of each segment of each row
+    """
+    nb_rows, nb_segments = len(values), plan["nb_segments"]
+
+    # bincount adds the weights of a bin one after the other, in the order of the elements (it returns integers when
+    # there are no elements)
+    def bin_sums(columns, bins, nb_bins):
+        keys = np.arange(nb_rows)[:, None] * nb_bins + bins
+        sums = np.bincount(
+            keys.ravel(), weights=values[:, columns].ravel(), minlength=nb_rows * nb_bins
+        )
+        return sums.astype(np.float64, copy=False).reshape(nb_rows, nb_bins)
+
+    sums = bin_sums(plan["short"], plan["short_segments"], nb_segments)
+
+    nb_blocked = len(plan["blocked_segments"])
+    if nb_blocked > 0:
+        lanes = bin_sums(plan["lanes"], plan["lane_bins"], nb_blocked * PAIRWISE_UNROLL)
+        lanes = lanes.reshape(nb_rows, nb_blocked, PAIRWISE_UNROLL)
+        sums[:, plan["blocked_segments"]] = (
+            (lanes[..., 0] + lanes[..., 1]) + (lanes[..., 2] + lanes[..., 3])
+        ) + ((lanes[..., 4] + lanes[..., 5]) + (lanes[..., 6] + lanes[..., 7]))
+        for columns, segments in plan["tails"]:
+            sums[:, segments] += values[:, columns]
+
+    if plan["halves"] is not None:
+        halves = pairwise_sums(values[:, plan["long"]], plan["halves"])
+        sums[:, plan["long_segments"]] = halves[:, 0::2] + halves[:, 1::2]
+
+    return sums
+
+
+def get_index_plan(index):
+    """Get the summation plan of the targets of a matching index, computed on the first call
+
+    Args:
+        index (dict): nonzero structure of the targets computed by get_matching_index or select_matching_index
+
+    Returns:
+        dict: the plan computed by get_pairwise_plan with one segment per target
+    """
+    if "plan" not in index:
+        index["plan"] = get_pairwise_plan(index["counts"])
+    return index["plan"]
+
+
+def get_matching_from_ratios(sums, counts):
+    """Divide the sums of the level ratios by the number of non zero skills of the targets, as matching does
+
+    Args:
+        sums (np.array): sums of the level ratios computed by pairwise_sums, the last axis is the targets
+        counts (np.array): number of non zero skills of each target
+
+    Returns:
+        np.array: the matchings, targets without skills have a matching of 0
+    """
+    matching = np.zeros(sums.shape)
+    nonempty = counts > 0
+    matching[..., nonempty] = sums[..., nonempty] / counts[nonempty]
+
+    return matching
+
+
+@profiler.profiled
+def pairwise_matching(learners, index):
+    """Compute the matching between the i-th learner and the i-th target for every i
+
+    Args:
+        learners (np.array): matrix of shape (nb_targets, nb_skills) with the mastery levels of each learner
+        index (dict): nonzero structure of the targets computed by get_matching_index or select_matching_index
+
+    Returns:
+        np.array: the matching of each learner with its target, equal to matching
+    """
+    levels = index["levels"]
+    # the ratios of all the pairs are in a single row, one segment per pair
+    ratios = np.minimum(learners[index["rows"], index["skills"]], levels) / levels
+    sums = pairwise_sums(ratios[None], get_index_plan(index))[0]
+    return get_matching_from_ratios(sums, index["counts"])
+
+
+@profiler.profiled
+def batch_matching(learners, index):
+    """Compute the matching between every learner of a block and every target in a few numpy operations
+
+    Args:
+        learners (np.array): matrix of shape (nb_learners, nb_skills) with the mastery levels of each learner
+        index (dict): nonzero structure of the targets computed by get_matching_index
+
+    Returns:
+        np.array: matrix of shape (nb_learners, nb_targets) with the matching of each learner with each target, equal to
+            matching
+    """
+    learners = np.atleast_2d(learners)
+    levels = index["levels"]
+
+    # divide the minimum by the target levels on the non zero elements of the targets only, then sum the ratios of
+    # each target in the order of np.sum
+    ratios = np.minimum(learners[:, index["skills"]], levels) / levels
+    sums = pairwise_sums(ratios, get_index_plan(index))
+    return get_matching_from_ratios(sums, index["counts"])
+
+
+@profiler.profiled
+def transpose_matching_index(index, nb_skills):
+    """Group the nonzero elements of a matching index by skill, to find quickly the targets that involve a skill
+
+    Args:
+        index (dict): nonzero structure of the targets computed by get_matching_index
+        nb_skills (int): number of skills
+
+    Returns:
+        dict: the index of the first element of each skill, and the target, level and weight of each element
+    """
+    order = np.argsort(index["skills"], kind="stable")
+    indptr = np.zeros(nb_skills + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(index["skills"], minlength=nb_skills))
+
+    return {
+        "indptr": indptr,
+        "targets": index["rows"][order],
+        "levels": index["levels"][order],
+        "weights": index["weights"][order],
+    }
+
+
+@profiler.profiled
+def overlap_matching_sums(learners, inverted_index, nb_targets, min_matching=None, counts=None):
+    """Compute the scaled sums of batch_matching_sums only for the pairs of a learner and a target that share at least one
+    skill. Since min(learner, target) is 0 on the skills that the learner does not have, the sum of a pair only involves
+    their shared skills, which are found with the inverted index of the targets (a sparse matrix-vector product)
+
+    If min_matching is given, the pairs that cannot reach it are skipped before their sums are computed. Each level ratio
+    is at most 1, so the matching of a pair is at most (number of shared skills) / (number of skills of the target), which
+    is itself at most (number of skills of the learner) / (number of skills of the target)
+
+    Args:
+        learners (np.array): matrix of shape (nb_learners, nb_skills) with the mastery levels of each learner
+        inverted_index (dict): nonzero structure of the targets grouped by skill computed by transpose_matching_index
+        nb_targets (int): number of targets
+        min_matching (float, optional): the pairs with an upper bound of the matching below it are not returned. Defaults
+            to None (all the pairs that share a skill are returned).
+        counts (np.array, optional): number of non zero skills of each target, required with min_matching. Defaults to None.
+
+    Returns:
+        tuple: the learner, the target, the scaled sum and the number of shared skills of each pair that shares a skill,
+            sorted by learner and target (the sums of the other pairs are 0)
+    """
+    learners = np.atleast_2d(learners)
+    rows, skills = np.nonzero(learners)
+    indptr = inverted_index["indptr"]
+    positions = SkillMatrix.get_positions(indptr, skills)
+    lengths = indptr[skills + 1] - indptr[skills]
+
+    # one element for each skill of each learner and each target that requires this skill
+    learner_levels = np.repeat(learners[rows, skills], lengths)
+    targets = inverted_index["targets"][positions]
+    element_rows = np.repeat(rows.astype(np.int64), lengths)
+    if min_matching is not None:
+        # the bounds are divided by the number of skills of the target as the matchings are, so that a pair that reaches
+        # min_matching is never pruned because of a rounding error
+        nb_learner_skills = np.bincount(rows, minlength=len(learners))
+        # the elements are only filtered if a learner has too few skills for the largest target
+        if np.any(nb_learner_skills < min_matching * counts.max(initial=0)):
+            kept = np.flatnonzero(
+                nb_learner_skills[element_rows] / counts[targets] >= min_matching
+            )
+            profiler.count("matchings.pruned_elements", len(targets) - len(kept))
+            learner_levels, targets, element_rows, positions = (
+                learner_levels.take(kept),
+                targets.take(kept),
+                element_rows.take(kept),
+                positions.take(kept),
+            )
+    keys = element_rows * nb_targets + targets
+
+    if len(learners) * nb_targets <= DENSE_ACCUMULATOR_SIZE:
+        # the pairs are accumulated in a dense array, which is faster than sorting the keys for small batches
+        overlaps = np.bincount(keys, minlength=len(learners) * nb_targets)
+        if min_matching is not None:
+            bounds = np.divide(
+                overlaps.reshape(-1, nb_targets),
+                counts,
+                out=np.zeros((len(learners), nb_targets)),
+                where=counts > 0,
+            ).ravel()
+            candidates = (bounds >= min_matching) & (overlaps > 0)
+            pairs = np.flatnonzero(candidates)
+            profiler.count("matchings.pruned_pairs", int(np.count_nonzero(overlaps) - len(pairs)))
+            # only the elements of the candidate pairs are used in the sums (integer indices are faster than masks)
+            kept = np.flatnonzero(candidates.take(keys))
+            keys, learner_levels, positions = (
+                keys.take(kept),
+                learner_levels.take(kept),
+                positions.take(kept),
+            )
+        else:
+            pairs = np.flatnonzero(overlaps)
+        sums = np.bincount(
+            keys,
+            weights=get_scaled_ratios(learner_levels, inverted_index, positions),
+            minlength=len(overlaps),
+        )
+        keys, sums, overlaps = pairs, sums[pairs], overlaps[pairs]
+    else:
+        keys, inverse, overlaps = np.unique(keys, return_inverse=True, return_counts=True)
+        if min_matching is not None:
+            candidates = overlaps / counts[keys % nb_targets] >= min_matching
+            profiler.count("matchings.pruned_pairs", int(len(keys) - np.count_nonzero(candidates)))
+            kept = np.flatnonzero(candidates.take(inverse))
+            # index of each candidate pair among the candidate pairs
+            inverse = (np.cumsum(candidates) - 1).take(inverse.take(kept))
+            keys, overlaps = keys[candidates], overlaps[candidates]
+            learner_levels, positions = learner_levels.take(kept), positions.take(kept)
+        sums = np.bincount(
+            inverse,
+            weights=get_scaled_ratios(learner_levels, inverted_index, positions),
+            minlength=len(keys),
+        )
+    if min_matching is not None:
+        profiler.count("matchings.matched_pairs", len(keys))
+
+    return keys // nb_targets, keys % nb_targets, sums, overlaps
+
+
+def get_scaled_ratios(learner_levels, inverted_index, positions):
+    """Compute the scaled level ratios of elements of an inverted index, see batch_matching_sums
+
+    Args:
+        learner_levels (np.array): the level of the learner on the skill of each element
+        inverted_index (dict): nonzero structure of the targets grouped by skill computed by transpose_matching_index
+        positions (np.array): the positions of the elements in the inverted index
+
+    Returns:
+        np.array: the scaled ratio min(learner, target) / target of each element
+    """
+    return (
+        np.minimum(learner_levels, inverted_index["levels"][positions])
+        * inverted_index["weights"][positions]
+    )
+
+
+def get_gain_elements(skills, old_levels, new_levels, inverted_index):
+    """Compute the changes of the scaled sums of the targets that involve some skills when the levels of a learner on
+    these skills are improved, see batch_matching_sums. Only the elements of the inverted index of these skills are read
+
+    Args:
+        skills (np.array): the improved skills, a skill can appear several times (e.g. once per course that provides it)
+        old_levels (np.array): the level of the learner on each skill before the improvement
+        new_levels (np.array): the level of the learner on each skill after the improvement, at least old_levels
+        inverted_index (dict): nonzero structure of the targets grouped by skill computed by transpose_matching_index
+
+    Returns:
+        tuple: the index of the improved skill in skills, the target and the change of the scaled sum of each element
+    """
+    indptr = inverted_index["indptr"]
+    positions = SkillMatrix.get_positions(indptr, skills)
+    lengths = indptr[skills + 1] - indptr[skills]
+    levels = inverted_index["levels"][positions]
+    # new >= old, so the difference of the unsigned levels is never negative
+    deltas = (
+        np.minimum(np.repeat(new_levels, lengths), levels)
+        - np.minimum(np.repeat(old_levels, lengths), levels)
+    ) * inverted_index["weights"][positions]
+
+    return np.repeat(np.arange(len(skills)), lengths), inverted_index["targets"][positions], deltas
+
+
+def select_matching_index(index, targets_ids):
+    """Restrict a matching index to a subset of the targets
+
+    Args:
+        index (dict): nonzero structure of the targets computed by get_matching_index
+        targets_ids (np.array): indices of the targets to keep
+
+    Returns:
+        dict: nonzero structure of the selected targets, the i-th target of the new index is targets_ids[i]
+    """
+    targets_ids = np.asarray(targets_ids, dtype=np.int64)
+    positions = SkillMatrix.get_positions(index["indptr"], targets_ids)
+    counts = index["counts"][targets_ids]
+    indptr = np.zeros(len(targets_ids) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(counts)
+
+    return {
+        "nb_targets": len(targets_ids),
+        "indptr": indptr,
+        "rows": np.repeat(np.arange(len(targets_ids)), counts),
+        "skills": index["skills"][positions],
+        "levels": index["levels"][positions],
+        "weights": index["weights"][positions],
+        "scale": index["scale"],
+        "counts": counts,
+    }
+
+
+@profiler.profiled
+def batch_course_matchings(learners, required_index, provided_index):
+    """Compute the required and provided matchings between every learner of a block and every course
+
+    Args:
+        learners (np.array): matrix of shape (nb_learners, nb_skills) with the mastery levels of each learner
+        required_index (dict): nonzero structure of the required skills of the courses
+        provided_index (dict): nonzero structure of the provided skills of the courses
+
+    Returns:
+        tuple: matrices of shape (nb_learners, nb_courses) with the required and provided matchings
+    """
+    required_matching = batch_matching(learners, required_index)
+
+    # the courses that have no required skills have a required matching of 1
+    required_matching[:, required_index["counts"] == 0] = 1.0
+
+    provided_matching = batch_matching(learners, provided_index)
+
+    return required_matching, provided_matching
@@ -0,0 +1,93 @@
+import os
+import multiprocessing
+
+from time import process_time
+
+import numpy as np
+
+import profiler
+
+# recommender of the worker processes, set by init_worker when the pool starts
+worker_recommender = None
+
+
+def init_worker(recommender):
+    """Initialize a worker process with the recommender. With the fork start method the recommender and its dataset are
+    inherited from the parent process and the read-only jobs and courses matrices are shared copy-on-write"""
+    global worker_recommender
+    worker_recommender = recommender
+    # the timers and counters of the parent process are not sent back
+    profiler.reset()
+
+
+def recommend_chunk(args):
+    """Recommend courses to a chunk of learners in a worker process
+
+    Args:
+        args (tuple): name of the method of the recommender, ids of the learners and number of courses to recommend
+
+    Returns:
+        tuple: ids of the learners, their recommendations, their updated profiles and the timers and counters of the profiler
+    """
+    method_name, learners_ids, k = args
+    recommendation_method = getattr(worker_recommender, method_name)
+    recommendations = [recommendation_method(i, k) for i in learners_ids]
+    learners = np.asarray(worker_recommender.dataset.learners[learners_ids])
+    return learners_ids, recommendations, learners, profiler.pop_state()
+
+
+def recommend_learners(recommender, method_name, k, nb_workers=1, chunk_size=16):
+    """Call recommender.method_name(learner_id, k) for every learner of the dataset. Each call only updates the profile of
+    its own learner, so if nb_workers > 1 the learners are split in chunks that are processed by a pool of processes, and the
+    updated profiles are copied back to the dataset. The result is the same as with nb_workers = 1.
+
+    Args:
+        recommender (object): recommender with a dataset attribute, e.g. Greedy or Optimal
+        method_name (str): name of the method that recommends and updates the profile of one learner
+        k (int): number of courses to recommend
+        nb_workers (int, optional): number of worker processes. Defaults to 1 (no pool).
+        chunk_size (int, optional): number of learners sent at once to a worker. Defaults to 16.
+
+    Returns:
+        list: the recommendations of every learner, in the order of the learners
+    """
+    nb_learners = len(recommender.dataset.learners)
+    if nb_workers <= 1:
+        recommendation_method = getattr(recommender, method_name)
+        return [recommendation_method(i, k) for i in range(nb_learners)]
+
+    chunks = [
+        (method_name, list(range(start, min(start + chunk_size, nb_learners))), k)
+        for start in range(0, nb_learners, chunk_size)
+    ]
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
+
+    recommendations = []
+    with context.Pool(
+        nb_workers, initializer=init_worker, initargs=(recommender,)
+    ) as pool:
+        # imap returns the chunks in order, so the recommendations are in the order of the learners
+        for learners_ids, chunk_recommendations, learners, profiler_state in pool.imap(
+            recommend_chunk, chunks
+        ):
+            recommendations.extend(chunk_recommendations)
+            profiler.merge_state(profiler_state)
+            for learner_id, learner in zip(learners_ids, learners):
+                recommender.dataset.learners[learner_id] = learner
+        pool.close()
+        pool.join()
+    return recommendations
+
+
+def cpu_time():
+    """Get the CPU time of the process and of its terminated child processes, so that the time spent in the workers of
+    recommend_learners is taken into account
+
+    Returns:
+        float: CPU time in seconds
+    """
+    times = os.times()
+    return process_time() + times.children_user + times.children_system
@@ -1,12 +1,20 @@
 import os
 import argparse
+import importlib
 
 import yaml
 
+import profiler
 from Dataset import Dataset
-from Greedy import Greedy
-from Optimal import Optimal
-from Reinforce import Reinforce
+
+# module and class of the recommender of each model, imported only when the model is run so that the heuristics do not
+# load stable-baselines3, torch and gymnasium; the agents dqn, a2c and ppo use reinforce
+MODEL_CLASSES = {
+    "greedy": ("Greedy", "Greedy"),
+    "optimal": ("Optimal", "Optimal"),
+    "beam_search": ("BeamSearch", "BeamSearch"),
+    "reinforce": ("Reinforce", "Reinforce"),
+}
 
 
 def create_and_print_dataset(config):
@@ -16,6 +24,19 @@ def create_and_print_dataset(config):
     return dataset
 
 
+def get_model_class(model):
+    """Import the recommender class of a model.
+
+    Args:
+        model (str): the model of the config, or reinforce
+
+    Returns:
+        type: the recommender class, Reinforce for the agents
+    """
+    module_name, class_name = MODEL_CLASSES.get(model, MODEL_CLASSES["reinforce"])
+    return getattr(importlib.import_module(module_name), class_name)
+
+
 def main():
     """Run the recommender system based on the provided model and parameters."""
     parser = argparse.ArgumentParser(description="Run recommender models.")
@@ -29,33 +50,68 @@ def main():
     with open(args.config, "r") as f:
         config = yaml.load(f, Loader=yaml.FullLoader)
 
-    model_classes = {
-        "greedy": Greedy,
-        "optimal": Optimal,
-        "reinforce": Reinforce,
-    }
+    # the timers and counters of the profiler are saved for each run if profile is true in the config
+    profiler.enable(config.get("profile", False))
 
     for run in range(config["nb_runs"]):
-        dataset = create_and_print_dataset(config)
-        # If the model is greedy or optimal, we use the corresponding class defined in Greedy.py and Optimal.py
-        if config["model"] in ["greedy", "optimal"]:
-            recommender = model_classes[config["model"]](dataset, config["threshold"])
-            recommendation_method = getattr(
-                recommender, f'{config["model"]}_recommendation'
-            )
-            recommendation_method(config["k"], run)
-        # Otherwise, we use the Reinforce class, described in Reinforce.py
-        else:
-            recommender = Reinforce(
-                dataset,
-                config["model"],
-                config["k"],
-                config["threshold"],
-                run,
-                config["total_steps"],
-                config["eval_freq"],
+        run_and_profile(config, run)
+
+
+def run_and_profile(config, run):
+    """Run the model of the config and save the report of the profiler of the run if it is enabled.
+
+    Args:
+        config (dict): the config
+        run (int): the run number
+
+    Returns:
+        Dataset: the dataset
+    """
+    profiler.reset()
+    with profiler.timer("pipeline.run"):
+        dataset = run_model(config, run)
+    if profiler.enabled:
+        profiler.save_report(
+            os.path.join(
+                config["results_path"],
+                f'profile_{config["model"]}_nbskills_{len(dataset.skills)}_k_{config["k"]}_run_{run}.json',
             )
-            recommender.reinforce_recommendation()
+        )
+    return dataset
+
+
+def run_model(config, run):
+    """Create the dataset and run the model of the config on it.
+
+    Args:
+        config (dict): the config
+        run (int): the run number
+
+    Returns:
+        Dataset: the dataset
+    """
+    recommender_class = get_model_class(config["model"])
+    dataset = create_and_print_dataset(config)
+    # If the model is greedy, optimal or beam_search, we use the corresponding class defined in Greedy.py, Optimal.py and BeamSearch.py
+    if config["model"] in ["greedy", "optimal", "beam_search"]:
+        recommender = recommender_class(dataset, config["threshold"])
+        recommendation_method = getattr(
+            recommender, f'{config["model"]}_recommendation'
+        )
+        recommendation_method(config["k"], run)
+    # Otherwise, we use the Reinforce class, described in Reinforce.py
+    else:
+        recommender = recommender_class(
+            dataset,
+            config["model"],
+            config["k"],
+            config["threshold"],
+            run,
+            config["total_steps"],
+            config["eval_freq"],
+        )
+        recommender.reinforce_recommendation()
+    return dataset
 
 
 if __name__ == "__main__":
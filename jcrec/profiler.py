@@ -0,0 +1,196 @@
+import sys
+import json
+import functools
+
+from time import perf_counter
+from contextlib import contextmanager
+from collections import defaultdict
+
+# the timers and counters are only updated when the profiler is enabled, e.g. with profile: true in the config
+enabled = False
+# name -> [number of calls, total time in seconds]
+timers = defaultdict(lambda: [0, 0.0])
+# name -> value
+counters = defaultdict(int)
+# functions decorated with profiled, replaced by their timed version in their module or class when the profiler is enabled
+profiled_functions = []
+
+
+def enable(value=True):
+    """Enable or disable the profiler. The functions decorated with profiled are replaced by their timed version in
+    their module or class when it is enabled, and restored when it is disabled
+
+    Args:
+        value (bool, optional): whether the profiler is enabled. Defaults to True.
+    """
+    global enabled
+    if value == enabled:
+        return
+    enabled = value
+    for function in profiled_functions:
+        setattr(
+            get_owner(function),
+            function.__name__,
+            get_timed_function(function) if value else function,
+        )
+
+
+def get_owner(function):
+    """Get the module or the class where a function is defined
+
+    Args:
+        function (function): the function
+
+    Returns:
+        object: the module or the class
+    """
+    owner = sys.modules[function.__module__]
+    for name in function.__qualname__.split(".")[:-1]:
+        owner = getattr(owner, name)
+    return owner
+
+
+def reset():
+    """Remove all the timers and counters"""
+    timers.clear()
+    counters.clear()
+
+
+def add_time(name, duration):
+    """Add a call of the given duration to a timer
+
+    Args:
+        name (str): name of the timer
+        duration (float): duration of the call in seconds
+    """
+    timer = timers[name]
+    timer[0] += 1
+    timer[1] += duration
+
+
+def count(name, value=1):
+    """Increment a counter if the profiler is enabled
+
+    Args:
+        name (str): name of the counter
+        value (int, optional): increment. Defaults to 1.
+    """
+    if enabled:
+        # the increments are often numpy integers (e.g. np.count_nonzero), they are stored as int to be saved in json
+        counters[name] += int(value)
+
+
+def profiled(function):
+    """Decorator that registers a function to be timed under its qualified name, e.g. Dataset.load_learners. The function
+    is returned unchanged, so it has no overhead when the profiler is disabled. The function must be called through its
+    module or class (e.g. matchings.matching and not a name imported with from matchings import matching)"""
+    profiled_functions.append(function)
+    # the modules imported after enable, e.g. the recommenders imported by the pipeline, are timed from the start
+    if enabled:
+        return get_timed_function(function)
+    return function
+
+
+def get_timed_function(function):
+    """Get the version of a function that adds the duration of each call to the timer of its qualified name
+
+    Args:
+        function (function): the function
+
+    Returns:
+        function: the timed function
+    """
+    name = function.__qualname__
+    if "." not in name:
+        # functions of a module are named after their module, e.g. matchings.matching
+        name = f"{function.__module__}.{name}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            add_time(name, perf_counter() - start)
+
+    return wrapper
+
+
+@contextmanager
+def timer(name):
+    """Context manager that times a block of code
+
+    Args:
+        name (str): name of the timer
+    """
+    if not enabled:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        add_time(name, perf_counter() - start)
+
+
+def pop_state():
+    """Get the timers and counters and reset them, e.g. to send them from a worker process to the main process
+
+    Returns:
+        tuple: the timers and the counters as dictionaries
+    """
+    state = dict(timers), dict(counters)
+    reset()
+    return state
+
+
+def merge_state(state):
+    """Add timers and counters returned by pop_state, e.g. in another process
+
+    Args:
+        state (tuple): the timers and the counters
+    """
+    state_timers, state_counters = state
+    for name, (nb_calls, total_time) in state_timers.items():
+        timers[name][0] += nb_calls
+        timers[name][1] += total_time
+    for name, value in state_counters.items():
+        counters[name] += value
+
+
+def get_report():
+    """Get the report of the timers, sorted by total time, and of the counters. The time of a function includes the time
+    of the profiled functions that it calls
+
+    Returns:
+        dict: number of calls, total and mean time in seconds of each timer, and value of each counter
+    """
+    return {
+        "timers": {
+            name: {
+                "nb_calls": nb_calls,
+                "total_time": total_time,
+                "mean_time": total_time / nb_calls,
+            }
+            for name, (nb_calls, total_time) in sorted(
+                timers.items(), key=lambda item: -item[1][1]
+            )
+        },
+        "counters": dict(sorted(counters.items())),
+    }
+
+
+def save_report(path):
+    """Save the report in a json file and print the main timers
+
+    Args:
+        path (str): path of the json file
+    """
+    report = get_report()
+    with open(path, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Profile saved in {path}")
+    for name, timer in list(report["timers"].items())[:10]:
+        print(
+            f"    {name:45s} {timer['nb_calls']:10d} calls {timer['total_time']:10.4f} s"
+        )
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules of jcrec import each other with flat imports, as when the scripts are run from the jcrec directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "jcrec"))
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+import benchmark
+from Dataset import Dataset
+from Greedy import Greedy
+
+
+def get_dataset(sparse):
+    rng = np.random.default_rng(0)
+    nb_skills = 20
+    learners = rng.integers(0, 4, size=(30, nb_skills)) * (rng.random((30, nb_skills)) < 0.3)
+    jobs = rng.integers(0, 4, size=(40, nb_skills)) * (rng.random((40, nb_skills)) < 0.3)
+    courses = rng.integers(0, 4, size=(15, 2, nb_skills)) * (rng.random((15, 2, nb_skills)) < 0.2)
+    config = {"seed": 0, "max_cv_skills": 15, "sparse": sparse, "nb_workers": 1}
+    mastery_levels = {"beginner": 1, "intermediate": 2, "expert": 3, "unknown": -1}
+    return Dataset.from_matrices(config, learners, jobs, courses, mastery_levels)
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_restore_learners(sparse):
+    dataset = get_dataset(sparse)
+    before = np.asarray(dataset.learners).copy()
+    original_learners = benchmark.copy_learners(dataset)
+
+    greedy = Greedy(dataset, 0.5)
+    for learner_id in range(len(before)):
+        greedy.recommend_sequence_and_update(learner_id, 2)
+    assert not np.array_equal(np.asarray(dataset.learners), before)
+
+    benchmark.restore_learners(dataset, original_learners)
+    assert np.array_equal(np.asarray(dataset.learners), before)
@@ -0,0 +1,42 @@
+import json
+
+import numpy as np
+
+import profiler
+
+
+def test_save_report_with_numpy_counters(tmp_path):
+    profiler.reset()
+    profiler.enable()
+    try:
+        profiler.count("numpy_counter", np.int64(3))
+        profiler.count("numpy_counter", np.count_nonzero(np.ones(2)))
+        profiler.count("int_counter")
+        path = tmp_path / "profile.json"
+        profiler.save_report(path)
+    finally:
+        profiler.enable(False)
+        profiler.reset()
+
+    with open(path) as f:
+        report = json.load(f)
+    assert report["counters"] == {"int_counter": 1, "numpy_counter": 5}
+
+
+def test_modules_imported_after_enable_are_timed(tmp_path, monkeypatch):
+    (tmp_path / "late_module.py").write_text(
+        "import profiler\n\n\n@profiler.profiled\ndef late_function():\n    return 1\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    profiler.reset()
+    profiler.enable()
+    try:
+        import late_module
+
+        assert late_module.late_function() == 1
+        report = profiler.get_report()
+    finally:
+        profiler.enable(False)
+        profiler.reset()
+
+    assert report["timers"]["late_module.late_function"]["nb_calls"] == 1